@@ -5,7 +5,7 @@ from mixer.backend.django import mixer as _mixer
 from posts.models import Group, Post
 
 
-@pytest.fixture()
+@pytest.fixture(autouse=True)
 def mock_media(settings):
     with tempfile.TemporaryDirectory() as temp_directory:
         settings.MEDIA_ROOT = temp_directory
@@ -123,7 +123,7 @@ class TestFollow:
         assert 'page_obj' in response.context, (
             'Проверьте, что передали переменную `page_obj` в контекст страницы `/follow/`'
         )
-        assert type(response.context['page_obj']) == Page, (
+        assert isinstance(response.context['page_obj'], Page), (
             'Проверьте, что переменная `page_obj` на странице `/follow/` типа `Page`'
         )
         assert len(response.context['page_obj']) == 2, (
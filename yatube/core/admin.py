@@ -0,0 +1,75 @@
+import os
+
+from django.conf import settings
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from core.models import ProfileCapture, Task
+
+
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    list_display = (
+        'created', 'mode', 'method', 'path', 'view_name', 'status',
+        'duration_ms', 'user', 'download',
+    )
+    list_filter = ('mode', 'view_name', 'created')
+    search_fields = ('path',)
+    readonly_fields = [field.name for field in ProfileCapture._meta.fields]
+    empty_value_display = '-пусто-'
+
+    def has_add_permission(self, request):
+        return False
+
+    def download(self, capture):
+        url = reverse('admin:core_profilecapture_download', args=[capture.pk])
+        return format_html('<a href="{}">{}</a>', url, capture.file)
+    download.short_description = 'Файл'
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:capture_id>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='core_profilecapture_download',
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, capture_id):
+        capture = get_object_or_404(ProfileCapture, pk=capture_id)
+        full_path = os.path.join(settings.PROFILE_CAPTURE_DIR, capture.file)
+        if not os.path.exists(full_path):
+            raise Http404('Файл профиля удален.')
+        return FileResponse(
+            open(full_path, 'rb'), as_attachment=True, filename=capture.file
+        )
+
+
+admin.site.register(ProfileCapture, ProfileCaptureAdmin)
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'name', 'status', 'priority', 'attempts', 'run_at',
+        'locked_by', 'created',
+    )
+    list_filter = ('status', 'name')
+    readonly_fields = [field.name for field in Task._meta.fields]
+    actions = ('retry',)
+    empty_value_display = '-пусто-'
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry(self, request, queryset):
+        queryset.filter(status=Task.FAILED).update(
+            status=Task.QUEUED, attempts=0, run_at=timezone.now()
+        )
+    retry.short_description = 'Повторить упавшие задачи'
+
+
+admin.site.register(Task, TaskAdmin)
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.utils.module_loading import autodiscover_modules
+
+        from core import sqlite
+        connection_created.connect(sqlite.configure)
+        # Модули tasks регистрируют фоновые задачи для runworker.
+        autodiscover_modules('tasks')
@@ -0,0 +1,47 @@
+import os
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite с немедленной блокировкой записи и защитой от fork.
+
+    Транзакции открываются как BEGIN IMMEDIATE: отложенная транзакция,
+    которая сначала читает, а потом пишет, при конкурентной записи
+    получает SQLITE_BUSY сразу, минуя busy_timeout. Соединение,
+    унаследованное процессом после fork, не используется и не
+    закрывается, а просто забывается.
+
+    Внешние ключи проверяются, только пока все данные в одной базе:
+    с несколькими POST_SHARDS посты и подписки ссылаются на
+    пользователей и группы из другой базы.
+    """
+
+    def foreign_keys_enforced(self):
+        return list(settings.POST_SHARDS) == [DEFAULT_DB_ALIAS]
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        if not self.foreign_keys_enforced():
+            connection.execute('PRAGMA foreign_keys = OFF')
+        self.pid = os.getpid()
+        return connection
+
+    def enable_constraint_checking(self):
+        if self.foreign_keys_enforced():
+            super().enable_constraint_checking()
+
+    def check_constraints(self, table_names=None):
+        if self.foreign_keys_enforced():
+            super().check_constraints(table_names)
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
+
+    def close_if_unusable_or_obsolete(self):
+        if self.connection is not None and self.pid != os.getpid():
+            self.connection = None
+            return
+        super().close_if_unusable_or_obsolete()
@@ -0,0 +1,17 @@
+from django.template.backends import django
+
+from core.profiling import timed
+
+
+class Template(django.Template):
+    render = timed('template', django.Template.render)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    """Шаблоны Django, время рендера которых попадает в профиль запроса."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
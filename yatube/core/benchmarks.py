@@ -0,0 +1,117 @@
+"""Замеры вьюх через тестовый клиент и сравнение с базовой линией."""
+import gc
+import json
+import math
+import time
+import tracemalloc
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from core.query_budget import QueryRecorder
+
+Scenario = namedtuple(
+    'Scenario', 'name url method data user', defaults=('get', None, None)
+)
+
+# Неизмеряемые прогоны: первые запросы компилируют шаблоны и греют
+# кэш страниц SQLite.
+WARMUP = 3
+
+# Разница меньше этих значений считается шумом, а не регрессией.
+SLACK = {'p50_ms': 1.0, 'p95_ms': 2.0, 'queries': 0, 'memory_kb': 64}
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(share * len(ordered)))
+    return ordered[rank - 1]
+
+
+def request(client, scenario):
+    method = getattr(client, scenario.method)
+    response = method(scenario.url, scenario.data or {})
+    if response.status_code >= 400:
+        raise AssertionError(
+            f'{scenario.name}: {scenario.url} ответил {response.status_code}'
+        )
+    return response
+
+
+def measure(client, scenario, repeat, warm=False):
+    """Гоняет сценарий repeat раз и возвращает метрики.
+
+    Без warm перед каждым запросом очищается кэш, и замер показывает
+    путь до базы и шаблонов. Память снимается отдельным прогоном:
+    tracemalloc сильно замедляет код и исказил бы задержки.
+    """
+    if scenario.user is not None:
+        client.force_login(scenario.user)
+    else:
+        client.logout()
+    for _ in range(WARMUP):
+        request(client, scenario)
+    gc.collect()
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        if not warm:
+            cache.clear()
+        with QueryRecorder() as recorder:
+            started = time.perf_counter()
+            request(client, scenario)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(recorder))
+    if not warm:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        request(client, scenario)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'queries': queries,
+        'memory_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(baseline, results, tolerance):
+    """Список регрессий: метрики, выросшие больше допустимого.
+
+    tolerance задает допустимый рост для каждой метрики
+    долей от базовой линии.
+    """
+    regressions = []
+    for dataset, scenarios in results.items():
+        for name, metrics in scenarios.items():
+            reference = baseline.get(dataset, {}).get(name)
+            if reference is None:
+                continue
+            for metric, value in metrics.items():
+                before = reference.get(metric)
+                if before is None:
+                    continue
+                limit = before * (1 + tolerance.get(metric, 0))
+                if value > limit and value - before > SLACK.get(metric, 0):
+                    regressions.append(
+                        f'{dataset}/{name} {metric}: {before} -> {value}'
+                    )
+    return regressions
+
+
+def load(path):
+    try:
+        with open(path, encoding='utf-8') as baseline:
+            return json.load(baseline)
+    except FileNotFoundError:
+        return {}
+
+
+def save(path, results):
+    with open(path, 'w', encoding='utf-8') as baseline:
+        json.dump(results, baseline, indent=2, sort_keys=True)
+        baseline.write('\n')
@@ -0,0 +1,131 @@
+"""Профилирование отдельного запроса по требованию.
+
+Профиль снимается, если запрос просит его параметром _profile или
+заголовком X-Profile, а пользователь — сотрудник или прислал ключ из
+PROFILE_CAPTURE_KEYS в заголовке X-Profile-Key. Режим cprofile пишет
+.pstats, режим sample — свернутые стеки (.folded) для flamegraph.pl
+и speedscope.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+
+from core.models import ProfileCapture
+from core.query_budget import untracked
+
+EXTENSIONS = {
+    ProfileCapture.CPROFILE: 'pstats',
+    ProfileCapture.SAMPLE: 'folded',
+}
+
+
+class StackSampler:
+    """Периодически снимает стек одного потока из отдельного потока."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self.fold(frame)] += 1
+
+    @staticmethod
+    def fold(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(
+                f'{os.path.basename(code.co_filename)}:{code.co_name}:'
+                f'{code.co_firstlineno}'
+            )
+            frame = frame.f_back
+        # В свернутом формате пробел отделяет число сэмплов.
+        return ';'.join(reversed(names)).replace(' ', '_')
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as folded:
+            for stack, count in self.stacks.most_common():
+                folded.write(f'{stack} {count}\n')
+
+
+def requested_mode(request):
+    mode = request.META.get('HTTP_X_PROFILE') or request.GET.get('_profile')
+    if mode not in EXTENSIONS:
+        return None
+    key = request.META.get('HTTP_X_PROFILE_KEY')
+    if key and key in settings.PROFILE_CAPTURE_KEYS:
+        return mode
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return mode
+    return None
+
+
+def capture_name(mode):
+    os.makedirs(settings.PROFILE_CAPTURE_DIR, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    return f'{name}.{EXTENSIONS[mode]}'
+
+
+class ProfileCaptureMiddleware:
+    """Снимает профиль запроса и записывает его в ProfileCapture."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        name = capture_name(mode)
+        path = os.path.join(settings.PROFILE_CAPTURE_DIR, name)
+        started = time.perf_counter()
+        if mode == ProfileCapture.CPROFILE:
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+            duration = time.perf_counter() - started
+            profiler.dump_stats(path)
+        else:
+            with StackSampler(
+                threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL
+            ) as sampler:
+                response = self.get_response(request)
+            duration = time.perf_counter() - started
+            sampler.dump(path)
+        match = request.resolver_match
+        user = getattr(request, 'user', None)
+        if user is not None and not user.is_authenticated:
+            user = None
+        with untracked(request):
+            capture = ProfileCapture.objects.create(
+                user=user,
+                mode=mode,
+                method=request.method,
+                path=request.get_full_path()[:2000],
+                view_name=match.view_name if match else '',
+                status=response.status_code,
+                duration_ms=duration * 1000,
+                file=name,
+            )
+        response['X-Profile-Capture'] = capture.pk
+        return response
@@ -0,0 +1,66 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.tasks import Worker
+
+
+def run_process(stop, drain):
+    # Остановку процессу передает stop, а не Ctrl+C группы процессов.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Worker(stop).run(drain)
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди core.tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Пул процессов вместо пула потоков: для задач на CPU.'
+        )
+        parser.add_argument(
+            '--drain', action='store_true',
+            help='Выйти, когда в очереди не останется готовых задач.'
+        )
+
+    def handle(self, *args, **options):
+        if options['processes']:
+            stop = multiprocessing.Event()
+            connections.close_all()
+            workers = [
+                multiprocessing.Process(
+                    target=run_process, args=(stop, options['drain'])
+                )
+                for _ in range(options['concurrency'])
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(
+                    target=Worker(stop).run, args=(options['drain'],),
+                    name=f'worker-{number}',
+                )
+                for number in range(options['concurrency'])
+            ]
+
+        def shutdown(signum, frame):
+            self.stdout.write('Остановка: доделываем текущие задачи.')
+            stop.set()
+
+        previous = {
+            signum: signal.signal(signum, shutdown)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import stress
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает конкурентную запись в SQLite до и после настройки.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200)
+
+    def handle(self, *args, **options):
+        variants = (
+            ('по умолчанию', {}, False),
+            ('настроенная', settings.SQLITE_PRAGMAS, True),
+        )
+        for title, pragmas, immediate in variants:
+            with tempfile.TemporaryDirectory() as directory:
+                locked, rate = stress(
+                    os.path.join(directory, 'stress.sqlite3'),
+                    options['workers'],
+                    options['writes'],
+                    pragmas,
+                    immediate,
+                )
+            self.stdout.write(
+                f'{title}: ошибок блокировки {locked}, '
+                f'записей в секунду {rate:.0f}'
+            )
@@ -0,0 +1,283 @@
+"""Метрики в текстовом формате Prometheus.
+
+Каждый процесс копит счетчики и гистограммы в памяти и раз в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл в METRICS_DIR.
+Эндпоинт /metrics складывает файлы всех процессов, поэтому воркеры
+gunicorn видны как одно приложение. Имя файла включает pid и время
+запуска процесса. Файлы умерших процессов и прежних запусков того же pid
+сборщик удаляет: иначе их счетчики суммировались бы вечно, а каталог
+рос бы с каждым перезапуском. Prometheus видит это как сброс счетчика.
+"""
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+PREFIX = 'yatube_'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34)
+FILE_NAME = re.compile(r'worker-(\d+)-(\d+)\.json')
+
+METRICS = {
+    'requests_total': (
+        'counter', 'Обработанные запросы.', None
+    ),
+    'request_duration_seconds': (
+        'histogram', 'Время обработки запроса.', LATENCY_BUCKETS
+    ),
+    'response_size_bytes': (
+        'histogram', 'Размер тела ответа.', SIZE_BUCKETS
+    ),
+    'db_queries': (
+        'histogram', 'Запросов к базе за запрос.', QUERY_BUCKETS
+    ),
+    'fragment_cache_total': (
+        'counter', 'Обращения к кэшу фрагментов шаблонов.', None
+    ),
+    'card_cache_total': (
+        'counter', 'Обращения к кэшу карточек постов.', None
+    ),
+    'thumbnails_generated_total': (
+        'counter', 'Сгенерированные миниатюры.', None
+    ),
+    'tasks_total': (
+        'counter', 'Выполненные фоновые задачи по исходу.', None
+    ),
+    'task_duration_seconds': (
+        'histogram', 'Время выполнения пачки фоновых задач.', LATENCY_BUCKETS
+    ),
+}
+
+
+class Registry:
+    """Метрики одного процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.name = f'worker-{self.pid}-{time.time_ns()}.json'
+        self.values = {}
+        self.flushed = time.monotonic()
+
+    def _series(self, name, labels):
+        if os.getpid() != self.pid:
+            # После fork потомок начинает со своих нулей и своего файла.
+            self.reset()
+        key = (name, tuple(sorted((labels or {}).items())))
+        if key not in self.values:
+            kind, _, buckets = METRICS[name]
+            if kind == 'counter':
+                self.values[key] = 0
+            else:
+                self.values[key] = [0] * (len(buckets) + 1) + [0]
+        return key
+
+    def inc(self, name, labels=None, value=1):
+        with self._lock:
+            key = self._series(name, labels)
+            self.values[key] += value
+
+    def observe(self, name, value, labels=None):
+        """Кладет значение в гистограмму: счетчики корзин и сумма."""
+        buckets = METRICS[name][2]
+        with self._lock:
+            key = self._series(name, labels)
+            series = self.values[key]
+            series[bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                [name, dict(labels), value]
+                for (name, labels), value in self.values.items()
+            ]
+
+    def flush(self, force=False):
+        """Сбрасывает метрики в файл процесса, не чаще раза в интервал."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory:
+            return
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.name)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as snapshot:
+            json.dump(self.snapshot(), snapshot)
+        os.replace(temporary, path)
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+
+def merge(snapshots):
+    """Складывает снимки разных процессов."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot:
+            if name not in METRICS:
+                continue
+            key = (name, tuple(sorted(labels.items())))
+            if key not in merged:
+                merged[key] = value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(merged[key], value)]
+            else:
+                merged[key] += value
+    return merged
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        return True
+    return True
+
+
+def prune(directory):
+    """Удаляет файлы умерших процессов; возвращает имена живых."""
+    latest = {}
+    stale = []
+    for name in os.listdir(directory):
+        match = FILE_NAME.fullmatch(name)
+        if match is None:
+            continue
+        pid, started = map(int, match.groups())
+        if not _alive(pid):
+            stale.append(name)
+            continue
+        # Тот же pid мог достаться новому процессу: живой — последний.
+        previous = latest.get(pid)
+        if previous is not None and previous[0] > started:
+            stale.append(name)
+            continue
+        if previous is not None:
+            stale.append(previous[1])
+        latest[pid] = (started, name)
+    for name in stale:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    return sorted(name for _, name in latest.values())
+
+
+def collect():
+    """Метрики всех процессов: файлы METRICS_DIR плюс текущий процесс."""
+    directory = settings.METRICS_DIR
+    if not directory:
+        return merge([registry.snapshot()])
+    registry.flush(force=True)
+    snapshots = []
+    for name in prune(directory):
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return merge(snapshots)
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(merged):
+    """Текстовый формат экспозиции Prometheus 0.0.4."""
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        series = sorted(
+            (labels, value) for (metric, labels), value in merged.items()
+            if metric == name
+        )
+        if not series:
+            continue
+        full = PREFIX + name
+        lines.append(f'# HELP {full} {description}')
+        lines.append(f'# TYPE {full} {kind}')
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append(f'{full}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), value):
+                cumulative += count
+                lines.append(
+                    f'{full}_bucket{_labels(labels, le=bound)} {cumulative}'
+                )
+            lines.append(f'{full}_sum{_labels(labels)} {_number(value[-1])}')
+            lines.append(f'{full}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Считает запросы, время, размер ответа и SQL по имени URL."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        inc('requests_total', {
+            'view': view,
+            'method': request.method,
+            'status': str(response.status_code),
+        })
+        observe('request_duration_seconds', elapsed, {'view': view})
+        if not response.streaming:
+            observe(
+                'response_size_bytes', len(response.content), {'view': view}
+            )
+        observe('db_queries', queries.count, {'view': view})
+        registry.flush()
+        return response
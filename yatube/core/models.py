@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class ProfileCapture(models.Model):
+    """Профиль одного запроса, снятый по требованию."""
+    CPROFILE = 'cprofile'
+    SAMPLE = 'sample'
+    MODES = (
+        (CPROFILE, 'cProfile'),
+        (SAMPLE, 'Сэмплирование стека'),
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='profile_captures')
+    mode = models.CharField(max_length=16, choices=MODES)
+    method = models.CharField(max_length=8)
+    path = models.CharField(max_length=2000)
+    view_name = models.CharField(max_length=200, blank=True)
+    status = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    file = models.CharField(max_length=255)
+
+    class Meta:
+        ordering = ('-created',)
+
+    def __str__(self):
+        return f'{self.mode} {self.method} {self.path}'
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди core.tasks."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Не выполнена'),
+    )
+    name = models.CharField(max_length=200)
+    payload = models.TextField(default='{}')
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=16, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('status', 'priority', 'run_at'),
+                name='task_queue_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
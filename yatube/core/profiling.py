@@ -0,0 +1,129 @@
+import functools
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Разделы Server-Timing в порядке вывода. Заголовки HTTP допускают
+# только ASCII, поэтому описания на английском.
+SECTIONS = (
+    ('db', 'queries'),
+    ('template', 'templates'),
+    ('thumbnail', 'thumbnails'),
+    ('total', 'total'),
+)
+
+current = ContextVar('profile', default=None)
+
+
+class Profile:
+    """Время и число вызовов по разделам в рамках одного запроса."""
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+        self._depth = Counter()
+
+    @contextmanager
+    def measure(self, section):
+        """Учитывает время блока; вложенные вызовы раздела не суммируются."""
+        self._depth[section] += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth[section] -= 1
+            if not self._depth[section]:
+                self.durations[section] += time.perf_counter() - started
+                self.counts[section] += 1
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.measure('db'):
+            return execute(sql, params, many, context)
+
+    def milliseconds(self, section):
+        return self.durations[section] * 1000
+
+    def header(self):
+        """Значение заголовка Server-Timing."""
+        parts = []
+        for section, description in SECTIONS:
+            if section not in self.durations:
+                continue
+            if section in ('db', 'thumbnail'):
+                description = f'{self.counts[section]} {description}'
+            parts.append(
+                f'{section};desc="{description}";'
+                f'dur={self.milliseconds(section):.1f}'
+            )
+        return ', '.join(parts)
+
+
+def timed(section, func):
+    """Оборачивает func так, чтобы ее время попадало в раздел профиля."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = current.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        with profile.measure(section):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class ProfilingMiddleware:
+    """Раскладывает время запроса по разделам для части запросов.
+
+    Доля профилируемых запросов задается PROFILING_SAMPLE_RATE.
+    Остальные запросы проходят без оберток над подключениями,
+    а замеряющие методы сводятся к одной проверке ContextVar.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+        profile = Profile()
+        token = current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                with profile.measure('total'):
+                    response = self.get_response(request)
+        finally:
+            current.reset(token)
+        request.profile = profile
+        response['Server-Timing'] = profile.header()
+        self.log(request, response, profile)
+        return response
+
+    def log(self, request, response, profile):
+        match = request.resolver_match
+        view = match.view_name if match else ''
+        fields = {
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'total_ms': round(profile.milliseconds('total'), 2),
+            'db_ms': round(profile.milliseconds('db'), 2),
+            'queries': profile.counts['db'],
+            'template_ms': round(profile.milliseconds('template'), 2),
+            'thumbnail_ms': round(profile.milliseconds('thumbnail'), 2),
+            'thumbnails': profile.counts['thumbnail'],
+        }
+        logger.info(
+            'profile %s',
+            ' '.join(f'{key}={value}' for key, value in fields.items()),
+            extra={'profile': fields},
+        )
@@ -0,0 +1,132 @@
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDERS = re.compile(r'\((?:%s, )*%s\)(?:, \((?:%s, )*%s\))*')
+# Служебные команды: транзакции и настройка нового соединения.
+SERVICE = (
+    'BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT',
+    'PRAGMA',
+)
+
+
+def query_budget(limit, sharded=0, per_shard=0):
+    """Объявляет, сколько SQL-запросов может сделать вьюха за запрос.
+
+    limit — бюджет с одной базой. С несколькими POST_SHARDS к нему
+    добавляются sharded запросов на разнесение по базам и per_shard
+    на каждый шард после первого.
+    """
+    def decorator(view_func):
+        view_func.query_budget = limit
+        view_func.query_budget_sharded = (sharded, per_shard)
+        return view_func
+    return decorator
+
+
+def budget_of(view_func):
+    """Бюджет вьюхи при текущем числе шардов или None."""
+    limit = getattr(view_func, 'query_budget', None)
+    shards = len(settings.POST_SHARDS)
+    if limit is None or shards == 1:
+        return limit
+    sharded, per_shard = getattr(view_func, 'query_budget_sharded', (0, 0))
+    return limit + sharded + per_shard * (shards - 1)
+
+
+def shape(sql):
+    """Форма запроса: SQL без разницы в длине списков параметров."""
+    return PLACEHOLDERS.sub('(...)', sql)
+
+
+class QueryRecorder:
+    """Записывает SQL всех подключений внутри блока with."""
+
+    def __init__(self):
+        self.queries = []
+        self.params = []
+        self.aliases = []
+        self._stack = None
+        self._paused = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self._paused and not sql.startswith(SERVICE):
+            self.queries.append(sql)
+            self.params.append(params)
+            self.aliases.append(context['connection'].alias)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __len__(self):
+        return len(self.queries)
+
+    @contextmanager
+    def paused(self):
+        self._paused = True
+        try:
+            yield
+        finally:
+            self._paused = False
+
+    def repeated(self):
+        """Формы запросов, повторенные больше допустимого (N+1).
+
+        Один и тот же запрос в разные шарды — не повтор.
+        """
+        limit = settings.QUERY_BUDGET_REPEAT_LIMIT
+        counts = Counter(zip(self.aliases, map(shape, self.queries)))
+        return {
+            sql: count
+            for (alias, sql), count in counts.items()
+            if count > limit
+        }
+
+
+def untracked(request):
+    """Запросы блока не входят в бюджет вьюхи: служебные записи."""
+    recorder = getattr(request, 'query_recorder', None)
+    return recorder.paused() if recorder is not None else nullcontext()
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы к БД и предупреждает о превышении бюджета вьюхи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET_ENABLED:
+            return self.get_response(request)
+        with QueryRecorder() as recorder:
+            request.query_recorder = recorder
+            response = self.get_response(request)
+        budget = getattr(request, 'query_budget', None)
+        repeated = recorder.repeated()
+        if budget is not None and len(recorder) > budget:
+            logger.warning(
+                'query budget exceeded: %s %d/%d',
+                request.path, len(recorder), budget
+            )
+        for sql, count in repeated.items():
+            logger.warning(
+                'repeated query (N+1): %s %dx %s', request.path, count, sql
+            )
+        response['X-Query-Count'] = len(recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = budget_of(view_func)
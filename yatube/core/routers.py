@@ -0,0 +1,88 @@
+"""Чтение с реплик, запись в основную базу.
+
+Роутер отправляет чтение на случайную базу из DATABASE_REPLICAS, а
+запись — в default. Реплика отстает от основной базы, поэтому после
+записи пользователь на REPLICA_PIN_SECONDS закрепляется за основной
+базой: ReplicaPinMiddleware ставит ему куку REPLICA_PIN_COOKIE, и пока
+она жива, его запросы читают из default. Вне запросов (команды,
+воркеры фоновых задач) чтение тоже идет в default: код там сразу
+читает то, что только что записал, например проверяет, остались ли
+ссылки на файл.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Состояние текущего запроса; вне запросов (команды, фоновые потоки)
+# его нет, и чтение идет в основную базу.
+current = ContextVar('replica_pin', default=None)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+# Модели, которые читаются только из default: воркер, выбравший задачи
+# на отстающей реплике, захватил бы уже взятые или выполненные.
+PRIMARY_ONLY = {'core.task'}
+
+
+class Pin:
+    def __init__(self, pinned, wrote):
+        self.pinned = pinned
+        self.wrote = wrote
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        pin = current.get()
+        if pin is None or pin.pinned or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label_lower in PRIMARY_ONLY:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        pin = current.get()
+        if pin is not None:
+            # Дальше в этом запросе читаем то, что только что записали.
+            pin.pinned = pin.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными из основной базы.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет за основной базой пользователя, который недавно писал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        unsafe = request.method not in SAFE_METHODS
+        pin = Pin(
+            pinned=unsafe or settings.REPLICA_PIN_COOKIE in request.COOKIES,
+            wrote=unsafe,
+        )
+        token = current.set(pin)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        if pin.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,79 @@
+"""Настройка соединений SQLite для конкурентной нагрузки."""
+import multiprocessing
+import sqlite3
+import time
+
+from django.conf import settings
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure(sender, connection, **kwargs):
+    """Обработчик connection_created: PRAGMA из SQLITE_PRAGMAS.
+
+    Настройки действуют на соединение, поэтому при CONN_MAX_AGE они
+    применяются один раз и живут вместе с постоянным соединением.
+    journal_mode=WAL сохраняется в файле базы; для базы в памяти
+    SQLite его молча игнорирует.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
+
+
+def _writer(path, pragmas, immediate, writes, results):
+    database = sqlite3.connect(path, timeout=5, isolation_level=None)
+    apply_pragmas(database, pragmas)
+    locked = 0
+    done = 0
+    begin = 'BEGIN IMMEDIATE' if immediate else 'BEGIN'
+    while done < writes:
+        try:
+            database.execute(begin)
+            # Как add_comment: сначала чтение поста, потом запись.
+            database.execute('SELECT total FROM post WHERE id = 1').fetchone()
+            database.execute("INSERT INTO comment (text) VALUES ('x')")
+            database.execute('UPDATE post SET total = total + 1 WHERE id = 1')
+            database.execute('COMMIT')
+            done += 1
+        except sqlite3.OperationalError as error:
+            if 'locked' not in str(error) and 'busy' not in str(error):
+                raise
+            locked += 1
+            if database.in_transaction:
+                database.execute('ROLLBACK')
+    database.close()
+    results.put(locked)
+
+
+def stress(path, workers, writes, pragmas=None, immediate=True):
+    """Гоняет конкурентную запись в файл path из workers процессов.
+
+    Возвращает (ошибок блокировки, записей в секунду). Каждая запись
+    повторяется до успеха, так что ошибки показывают потерянную работу.
+    """
+    database = sqlite3.connect(path, isolation_level=None)
+    database.execute('CREATE TABLE post (id INTEGER PRIMARY KEY, total INT)')
+    database.execute('CREATE TABLE comment (id INTEGER PRIMARY KEY, text)')
+    database.execute('INSERT INTO post (id, total) VALUES (1, 0)')
+    database.close()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=_writer,
+            args=(path, pragmas or {}, immediate, writes, results),
+        )
+        for _ in range(workers)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    locked = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    return locked, workers * writes / elapsed
@@ -0,0 +1,241 @@
+"""Очередь фоновых задач в таблице core_task.
+
+Функция становится задачей декоратором @task; вызов .delay() кладет
+строку в очередь, а manage.py runworker выполняет задачи в пуле потоков
+или процессов. Воркер берет задачу с наибольшим приоритетом, у
+пакетной задачи (batch=N) — еще до N - 1 таких же, и вызывает функцию
+один раз со списком kwargs. Упавшая задача повторяется через
+TASK_RETRY_DELAY * 2 ** (попытка - 1) секунд, после последней
+попытки остается в таблице со статусом failed. Выполненные задачи
+удаляются.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (DatabaseError, close_old_connections, connection,
+                       transaction)
+from django.db.models import F
+from django.utils import timezone
+
+from core import metrics
+from core.models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Registered:
+    """Функция, зарегистрированная как задача."""
+
+    def __init__(self, func, name, priority, max_attempts, batch):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.batch = batch
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Ставит вызов в очередь с приоритетом задачи."""
+        return self.enqueue(args, kwargs)
+
+    def enqueue(self, args=(), kwargs=None, priority=None, countdown=0):
+        kwargs = kwargs or {}
+        if self.batch and args:
+            raise TypeError('Пакетная задача принимает только kwargs.')
+        if settings.TASKS_EAGER:
+            execute([Task(
+                name=self.name,
+                payload=json.dumps({'args': args, 'kwargs': kwargs}),
+            )])
+            return None
+        return Task.objects.create(
+            name=self.name,
+            payload=json.dumps({'args': args, 'kwargs': kwargs}),
+            priority=self.priority if priority is None else priority,
+            run_at=timezone.now() + timedelta(seconds=countdown),
+        )
+
+
+def task(name=None, priority=0, retries=None, batch=None):
+    """Регистрирует функцию как фоновую задачу.
+
+    retries — число повторов после первой попытки, по умолчанию
+    TASK_MAX_ATTEMPTS - 1. Пакетная задача получает список kwargs всех
+    вызовов пачки.
+    """
+    def decorator(func):
+        registered = Registered(
+            func,
+            name or f'{func.__module__}.{func.__qualname__}',
+            priority,
+            settings.TASK_MAX_ATTEMPTS if retries is None else retries + 1,
+            batch,
+        )
+        registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи упавших воркеров."""
+    stale = timezone.now() - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    return Task.objects.filter(
+        status=Task.RUNNING, locked_at__lt=stale
+    ).update(status=Task.QUEUED, locked_by='', locked_at=None)
+
+
+def claim(worker):
+    """Забирает следующую задачу, а для пакетной — всю пачку."""
+    now = timezone.now()
+    with transaction.atomic():
+        queued = Task.objects.filter(
+            status=Task.QUEUED, run_at__lte=now
+        ).order_by('-priority', 'run_at', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            queued = queued.select_for_update(skip_locked=True)
+        first = queued.first()
+        if first is None:
+            return []
+        batch = [first]
+        registered = registry.get(first.name)
+        if registered is not None and registered.batch:
+            batch += queued.filter(name=first.name).exclude(
+                pk=first.pk
+            )[:registered.batch - 1]
+        # На SQLite транзакция начинается с BEGIN IMMEDIATE, поэтому
+        # выборку и захват не разделит другой воркер.
+        Task.objects.filter(pk__in=[item.pk for item in batch]).update(
+            status=Task.RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    for item in batch:
+        item.attempts += 1
+    return batch
+
+
+def retry_delay(attempts):
+    return min(
+        settings.TASK_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.TASK_RETRY_MAX_DELAY,
+    )
+
+
+def _fail(batch, registered, error):
+    now = timezone.now()
+    for item in batch:
+        if registered is not None and (
+            item.attempts < registered.max_attempts
+        ):
+            item.status = Task.QUEUED
+            item.run_at = now + timedelta(seconds=retry_delay(item.attempts))
+            result = 'retry'
+        else:
+            item.status = Task.FAILED
+            result = 'failed'
+        item.last_error = error
+        item.locked_by = ''
+        item.locked_at = None
+        if item.pk is not None:
+            item.save(update_fields=(
+                'status', 'run_at', 'last_error', 'locked_by', 'locked_at'
+            ))
+        metrics.inc('tasks_total', {'task': item.name, 'result': result})
+        logger.warning(
+            'task %s #%s %s attempt=%d', item.name, item.pk, result,
+            item.attempts
+        )
+
+
+def execute(batch):
+    """Выполняет пачку задач одного имени."""
+    name = batch[0].name
+    registered = registry.get(name)
+    if registered is None:
+        _fail(batch, None, f'Задача {name} не зарегистрирована.')
+        return
+    started = time.perf_counter()
+    calls = [json.loads(item.payload) for item in batch]
+    try:
+        if registered.batch:
+            registered.func([call['kwargs'] for call in calls])
+        else:
+            for call in calls:
+                registered.func(*call['args'], **call['kwargs'])
+    except Exception:
+        if settings.TASKS_EAGER:
+            raise
+        _fail(batch, registered, traceback.format_exc())
+        return
+    finally:
+        metrics.observe(
+            'task_duration_seconds', time.perf_counter() - started,
+            {'task': name},
+        )
+    Task.objects.filter(
+        pk__in=[item.pk for item in batch if item.pk is not None]
+    ).delete()
+    metrics.inc('tasks_total', {'task': name, 'result': 'done'}, len(batch))
+    logger.debug(
+        'task %s done jobs=%d time=%.2fms',
+        name, len(batch), (time.perf_counter() - started) * 1000
+    )
+
+
+class Worker:
+    """Цикл воркера: захват, выполнение, ожидание при пустой очереди."""
+
+    def __init__(self, stop, poll_interval=None):
+        self.stop = stop
+        self.poll_interval = (
+            settings.TASK_POLL_INTERVAL
+            if poll_interval is None else poll_interval
+        )
+        self.processed = 0
+
+    @property
+    def name(self):
+        return (
+            f'{socket.gethostname()}:{os.getpid()}:'
+            f'{threading.current_thread().name}'
+        )
+
+    def run_once(self):
+        """Выполняет одну пачку; возвращает число задач в ней."""
+        close_old_connections()
+        batch = claim(self.name)
+        if batch:
+            execute(batch)
+            self.processed += len(batch)
+        metrics.registry.flush()
+        return len(batch)
+
+    def run(self, drain=False):
+        """Работает до stop; с drain — пока в очереди есть задачи."""
+        try:
+            while not self.stop.is_set():
+                try:
+                    if self.run_once():
+                        continue
+                    if drain:
+                        return
+                    requeue_stale()
+                except DatabaseError:
+                    # Незавершенную задачу вернет в очередь requeue_stale.
+                    logger.exception('task worker %s', self.name)
+                self.stop.wait(self.poll_interval)
+        finally:
+            metrics.registry.flush(force=True)
+            connection.close()
@@ -0,0 +1,52 @@
+from contextvars import ContextVar
+
+from django import template
+from django.templatetags import cache
+
+from core import metrics
+
+register = template.Library()
+
+fragment_missed = ContextVar('fragment_missed', default=False)
+
+
+class FragmentNodes:
+    """Содержимое тега {% cache %}: его рендер означает промах кэша."""
+
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def __getattr__(self, name):
+        return getattr(self.nodelist, name)
+
+    def __iter__(self):
+        return iter(self.nodelist)
+
+    def render(self, context):
+        fragment_missed.set(True)
+        return self.nodelist.render(context)
+
+
+class MeteredCacheNode(cache.CacheNode):
+    """{% cache %}, который считает попадания и промахи в /metrics."""
+
+    def render(self, context):
+        token = fragment_missed.set(False)
+        try:
+            return super().render(context)
+        finally:
+            result = 'miss' if fragment_missed.get() else 'hit'
+            fragment_missed.reset(token)
+            metrics.inc('fragment_cache_total', {
+                'fragment': self.fragment_name, 'result': result
+            })
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    """Тот же {% cache %} из django.templatetags.cache, но со счетчиком."""
+    node = cache.do_cache(parser, token)
+    return MeteredCacheNode(
+        FragmentNodes(node.nodelist), node.expire_time_var,
+        node.fragment_name, node.vary_on, node.cache_name,
+    )
@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+from urllib.parse import urlparse
+
+from django.db import connection, connections
+from django.test import override_settings
+from django.urls import resolve
+
+from core.query_budget import QueryRecorder, budget_of
+
+
+class QueryBudgetMixin:
+    """Примесь к TestCase для проверки бюджета запросов вьюх."""
+
+    def assertWithinBudget(self, client, url, method='get', data=None):
+        budget = budget_of(resolve(urlparse(url).path).func)
+        with QueryRecorder() as recorder:
+            getattr(client, method)(url, data)
+        queries = '\n'.join(recorder.queries)
+        self.assertLessEqual(
+            len(recorder), budget,
+            f'{url}: {len(recorder)} запросов при бюджете {budget}\n'
+            f'{queries}'
+        )
+        self.assertEqual(
+            recorder.repeated(), {}, f'{url}: повторяющиеся запросы (N+1)'
+        )
+        return recorder
+
+
+class TempMediaMixin:
+    """Примесь к TestCase: MEDIA_ROOT во временном каталоге класса.
+
+    Каталог создается при подготовке класса, а не при импорте модуля,
+    и удаляется после его тестов.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp(prefix='yatube-media-')
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.media_override.disable()
+            shutil.rmtree(cls.media_root, ignore_errors=True)
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls.media_override.disable()
+            shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+def add_database(alias, name):
+    """Подключает файл SQLite name как базу alias на время тестов."""
+    connections.databases[alias] = {
+        **connection.settings_dict,
+        'NAME': name,
+        'TEST': {'NAME': None},
+    }
+
+
+def remove_database(alias):
+    connections[alias].close()
+    del connections[alias]
+    del connections.databases[alias]
@@ -0,0 +1,48 @@
+from django.test import Client, TestCase
+
+from core.benchmarks import Scenario, compare, measure, percentile
+
+TOLERANCE = {'p50_ms': 0.5, 'queries': 0}
+
+
+class BenchmarksTest(TestCase):
+    def test_percentile_uses_nearest_rank(self):
+        """Перцентиль берется методом ближайшего ранга"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile([7], 0.95), 7)
+
+    def test_compare_reports_growth_past_tolerance(self):
+        """Рост метрики сверх допуска считается регрессией"""
+        baseline = {'10': {'index': {'p50_ms': 10.0, 'queries': 3}}}
+        results = {'10': {'index': {'p50_ms': 14.0, 'queries': 4}}}
+        self.assertEqual(
+            compare(baseline, results, TOLERANCE),
+            ['10/index queries: 3 -> 4'],
+        )
+
+    def test_compare_ignores_noise_and_new_scenarios(self):
+        """Мелкие колебания и новые сценарии не считаются регрессией"""
+        baseline = {'10': {'index': {'p50_ms': 0.2, 'queries': 3}}}
+        results = {
+            '10': {
+                'index': {'p50_ms': 0.9, 'queries': 3},
+                'profile': {'p50_ms': 100.0, 'queries': 50},
+            },
+            '100': {'index': {'p50_ms': 100.0, 'queries': 50}},
+        }
+        self.assertEqual(compare(baseline, results, TOLERANCE), [])
+
+    def test_measure_returns_metrics(self):
+        """Замер отдает задержки, число запросов и память"""
+        metrics = measure(Client(), Scenario('about', '/about/author/'), 3)
+        self.assertEqual(
+            set(metrics), {'p50_ms', 'p95_ms', 'queries', 'memory_kb'}
+        )
+        self.assertLessEqual(metrics['p50_ms'], metrics['p95_ms'])
+
+    def test_measure_fails_on_error_response(self):
+        """Сценарий с ответом 4xx прерывает замер"""
+        with self.assertRaises(AssertionError):
+            measure(Client(), Scenario('missing', '/missing/'), 1)
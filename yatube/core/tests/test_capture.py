@@ -0,0 +1,92 @@
+import os
+import pstats
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.models import ProfileCapture
+
+User = get_user_model()
+
+TEMP_PROFILE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    PROFILE_CAPTURE_DIR=TEMP_PROFILE_DIR,
+    PROFILE_CAPTURE_KEYS=('secret',),
+    PROFILE_SAMPLE_INTERVAL=0.0005,
+)
+class ProfileCaptureTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create(
+            username='staff', is_staff=True, is_superuser=True
+        )
+        cls.user = User.objects.create(username='me')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def capture_file(self, capture):
+        return os.path.join(TEMP_PROFILE_DIR, capture.file)
+
+    def test_staff_captures_cprofile(self):
+        """Сотрудник снимает cProfile параметром _profile"""
+        response = self.staff_client.get(
+            reverse('posts:follow_index'), {'_profile': 'cprofile'}
+        )
+        capture = ProfileCapture.objects.get()
+        self.assertEqual(str(capture.pk), response['X-Profile-Capture'])
+        self.assertEqual(capture.view_name, 'posts:follow_index')
+        self.assertEqual(capture.user, self.staff)
+        stats = pstats.Stats(self.capture_file(capture))
+        self.assertGreater(stats.total_calls, 0)
+
+    def test_allowed_key_captures_stack_samples(self):
+        """Ключ из списка разрешает сэмплирование без входа"""
+        Client().get(
+            reverse('posts:index'),
+            HTTP_X_PROFILE='sample',
+            HTTP_X_PROFILE_KEY='secret',
+        )
+        capture = ProfileCapture.objects.get()
+        self.assertEqual(capture.mode, ProfileCapture.SAMPLE)
+        self.assertIsNone(capture.user)
+        with open(self.capture_file(capture), encoding='utf-8') as folded:
+            for line in folded:
+                self.assertRegex(line, r'^\S+ \d+$')
+
+    def test_others_cannot_capture(self):
+        """Обычный пользователь и чужой ключ профиль не снимают"""
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('posts:index'), {'_profile': 'cprofile'})
+        Client().get(
+            reverse('posts:index'),
+            HTTP_X_PROFILE='cprofile',
+            HTTP_X_PROFILE_KEY='wrong',
+        )
+        self.assertFalse(ProfileCapture.objects.exists())
+
+    def test_captures_are_listed_in_admin(self):
+        """Снятые профили видны и скачиваются в админке"""
+        self.staff_client.get(reverse('posts:index'), {'_profile': 'cprofile'})
+        capture = ProfileCapture.objects.get()
+        response = self.staff_client.get(
+            reverse('admin:core_profilecapture_changelist')
+        )
+        self.assertContains(response, capture.file)
+        response = self.staff_client.get(
+            reverse('admin:core_profilecapture_download', args=[capture.pk])
+        )
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,186 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+from posts.tasks import generate_thumbnails
+
+from core import metrics
+from core.testing import TempMediaMixin
+from core.tests.test_profiling import SMALL_GIF
+
+User = get_user_model()
+
+SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+TOKEN = 'scrape-token'
+
+
+def scrape(client=None):
+    """Заглушка сборщика Prometheus: разбирает ответ /metrics."""
+    response = (client or Client()).get(
+        '/metrics', HTTP_AUTHORIZATION=f'Bearer {TOKEN}'
+    )
+    assert response.status_code == 200, response.status_code
+    samples = {}
+    for line in response.content.decode().splitlines():
+        if not line or line.startswith('#'):
+            continue
+        name, labels, value = SAMPLE.match(line).groups()
+        key = (name, frozenset(LABEL.findall(labels or '')))
+        samples[key] = float(value)
+    return samples
+
+
+def sample(samples, name, **labels):
+    return samples.get((name, frozenset(labels.items())), 0)
+
+
+class MetricsTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(
+            METRICS_DIR=self.directory, METRICS_TOKEN=TOKEN
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.registry.reset()
+        cache.clear()
+
+    def test_requests_are_counted_by_url_name(self):
+        """Запросы считаются по именам URL из posts, users и about"""
+        client = Client()
+        client.get(reverse('posts:index'))
+        client.get(reverse('users:signup'))
+        client.get(reverse('about:author'))
+        client.get('/missing/')
+        samples = scrape()
+        for view in ('posts:index', 'users:signup', 'about:author'):
+            self.assertEqual(sample(
+                samples, 'yatube_requests_total',
+                view=view, method='GET', status='200'
+            ), 1)
+            self.assertEqual(sample(
+                samples, 'yatube_request_duration_seconds_count', view=view
+            ), 1)
+        self.assertEqual(sample(
+            samples, 'yatube_requests_total',
+            view='unmatched', method='GET', status='404'
+        ), 1)
+
+    def test_histograms_are_cumulative(self):
+        """Корзины гистограмм накопительные, +Inf равна числу наблюдений"""
+        Client().get(reverse('posts:index'))
+        samples = scrape()
+        buckets = [
+            sample(
+                samples, 'yatube_response_size_bytes_bucket',
+                view='posts:index', le=str(bound)
+            )
+            for bound in (*metrics.SIZE_BUCKETS, '+Inf')
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 1)
+        self.assertGreater(sample(
+            samples, 'yatube_response_size_bytes_sum', view='posts:index'
+        ), 0)
+        self.assertEqual(sample(
+            samples, 'yatube_db_queries_count', view='posts:index'
+        ), 1)
+
+    def test_feed_cache_hits_and_misses(self):
+        """Повторный показ ленты попадает в кэш фрагмента и карточек"""
+        Post.objects.create(text='Пост', author=self.user)
+        client = Client()
+        client.get(reverse('posts:index'))
+        client.get(reverse('posts:index'))
+        samples = scrape()
+        for result in ('hit', 'miss'):
+            self.assertEqual(sample(
+                samples, 'yatube_fragment_cache_total',
+                fragment='feed', result=result
+            ), 1)
+        self.assertEqual(sample(
+            samples, 'yatube_card_cache_total', result='miss'
+        ), 1)
+
+    def test_thumbnail_generation_is_counted(self):
+        """Генерация миниатюр в фоне увеличивает счетчик"""
+        post = Post.objects.create(
+            text='Пост',
+            author=self.user,
+            image=SimpleUploadedFile(
+                'metrics.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        generate_thumbnails([{'post_id': post.pk}])
+        self.assertGreaterEqual(
+            sample(scrape(), 'yatube_thumbnails_generated_total'), 1
+        )
+
+    def test_workers_are_aggregated(self):
+        """Сборщик видит сумму метрик всех воркеров"""
+        other = metrics.Registry()
+        other.name = f'worker-{os.getppid()}-1.json'
+        other.inc('requests_total', {
+            'view': 'posts:index', 'method': 'GET', 'status': '200'
+        }, 5)
+        other.flush(force=True)
+        Client().get(reverse('posts:index'))
+        self.assertEqual(sample(
+            scrape(), 'yatube_requests_total',
+            view='posts:index', method='GET', status='200'
+        ), 6)
+
+    def test_dead_workers_are_removed(self):
+        """Файлы умерших и перезапущенных воркеров удаляются"""
+        process = subprocess.Popen(['true'])
+        process.wait()
+        files = {
+            'dead': f'worker-{process.pid}-1.json',
+            'restarted': f'worker-{os.getpid()}-1.json',
+        }
+        for name in files.values():
+            other = metrics.Registry()
+            other.name = name
+            other.inc('requests_total', {
+                'view': 'posts:index', 'method': 'GET', 'status': '200'
+            }, 5)
+            other.flush(force=True)
+        Client().get(reverse('posts:index'))
+        self.assertEqual(sample(
+            scrape(), 'yatube_requests_total',
+            view='posts:index', method='GET', status='200'
+        ), 1)
+        self.assertEqual(
+            os.listdir(self.directory), [metrics.registry.name]
+        )
+
+    def test_metrics_are_internal(self):
+        """Метрики закрыты для внешних адресов"""
+        response = Client(REMOTE_ADDR='10.0.0.1').get(
+            '/metrics', HTTP_AUTHORIZATION=f'Bearer {TOKEN}'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_require_token(self):
+        """Без верного токена метрики не отдаются и с локального адреса"""
+        for header in ('', 'Bearer wrong', TOKEN):
+            response = Client().get('/metrics', HTTP_AUTHORIZATION=header)
+            self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            response = Client().get('/metrics', HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 403)
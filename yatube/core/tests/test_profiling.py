@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+
+from core.profiling import Profile
+from core.testing import TempMediaMixin
+
+User = get_user_model()
+
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+class ProfilingTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+        cls.post = Post.objects.create(
+            text='Пост',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_nested_sections_are_counted_once(self):
+        """Вложенные замеры одного раздела не складываются"""
+        profile = Profile()
+        with profile.measure('template'):
+            with profile.measure('template'):
+                pass
+        self.assertEqual(profile.counts['template'], 1)
+
+    def test_server_timing_header(self):
+        """Ответ содержит разбивку времени по разделам"""
+        response = Client().get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        header = response['Server-Timing']
+        for section in ('db;', 'template;', 'thumbnail;', 'total;'):
+            self.assertIn(section, header)
+
+    def test_structured_log_line(self):
+        """Профиль запроса пишется в лог одной строкой ключ=значение"""
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            Client().get(reverse('posts:index'))
+        line = logs.output[0]
+        self.assertIn('view=posts:index', line)
+        self.assertIn('status=200', line)
+        self.assertRegex(line, r'queries=\d+')
+        self.assertEqual(logs.records[0].profile['view'], 'posts:index')
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_profiled(self):
+        """Запросы вне выборки идут без заголовка и записи в лог"""
+        response = Client().get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
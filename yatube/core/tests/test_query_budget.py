@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.query_budget import QueryRecorder, shape
+
+User = get_user_model()
+
+
+class QueryBudgetTest(TestCase):
+    def test_shape_ignores_parameter_count(self):
+        """Форма запроса не зависит от длины списка IN"""
+        self.assertEqual(
+            shape('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            shape('SELECT 1 WHERE id IN (%s)'),
+        )
+
+    def test_recorder_detects_repeated_queries(self):
+        """Повторяющийся в цикле запрос помечается как N+1"""
+        users = [User.objects.create(username=f'u{i}') for i in range(3)]
+        with QueryRecorder() as recorder:
+            for user in users:
+                User.objects.get(pk=user.pk)
+        self.assertEqual(list(recorder.repeated().values()), [3])
+
+    def test_service_queries_are_not_counted(self):
+        """Настройка соединения и приостановленная запись не считаются"""
+        with QueryRecorder() as recorder:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA foreign_keys')
+            with recorder.paused():
+                User.objects.count()
+            User.objects.exists()
+        self.assertEqual(len(recorder), 1)
+
+    def test_middleware_reports_query_count(self):
+        """Middleware отдает число запросов в заголовке"""
+        response = Client().get(reverse('posts:index'))
+        self.assertIn('X-Query-Count', response)
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import Post
+
+from core.models import Task
+from core.routers import Pin, ReplicaRouter, current
+from core.tasks import claim
+from core.testing import add_database, remove_database
+
+User = get_user_model()
+
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRouterTest(TransactionTestCase):
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        add_database(
+            REPLICA, os.path.join(cls.directory.name, 'replica.sqlite3')
+        )
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        remove_database(REPLICA)
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.replicate()
+        self.author = User.objects.create(username='author')
+        Post.objects.create(text='Старый пост', author=self.author)
+        self.replicate()
+        cache.clear()
+
+    def replicate(self):
+        """Реплика как копия файла основной базы на текущий момент."""
+        connections[REPLICA].close()
+        connection.ensure_connection()
+        target = sqlite3.connect(connections.databases[REPLICA]['NAME'])
+        connection.connection.backup(target)
+        target.close()
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        """В запросе чтение идет на реплику, запись — в основную базу"""
+        router = ReplicaRouter()
+        token = current.set(Pin(pinned=False, wrote=False))
+        self.addCleanup(current.reset, token)
+        self.assertEqual(router.db_for_read(Post), REPLICA)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(post._state.db, 'default')
+        self.assertFalse(
+            Post.objects.using(REPLICA).filter(pk=post.pk).exists()
+        )
+
+    def test_reads_outside_requests_go_to_primary(self):
+        """Команды и воркеры читают свои записи из основной базы"""
+        self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(Post.objects.filter(pk=post.pk).exists())
+
+    def test_tasks_are_claimed_on_primary(self):
+        """Воркер не берет задачи по устаревшей копии на реплике"""
+        token = current.set(Pin(pinned=False, wrote=False))
+        self.assertEqual(ReplicaRouter().db_for_read(Task), 'default')
+        current.reset(token)
+        task = Task.objects.create(
+            name='core.tests.stale', payload='{}', run_at=timezone.now()
+        )
+        self.replicate()
+        Task.objects.filter(pk=task.pk).update(status=Task.RUNNING)
+        self.assertEqual(claim('worker'), [])
+        self.assertEqual(
+            Task.objects.using(REPLICA).get(pk=task.pk).status, Task.QUEUED
+        )
+
+    def test_lagging_replica_is_served_to_readers(self):
+        """Без недавней записи страницы читаются с реплики"""
+        Post.objects.create(text='Новый пост', author=self.author)
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Старый пост')
+        self.assertNotContains(response, 'Новый пост')
+
+    def test_writer_reads_own_writes(self):
+        """Автор новой записи читает ее из основной базы"""
+        client = Client()
+        client.force_login(self.author)
+        self.replicate()
+        response = client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        self.assertIn('primary', response.cookies)
+        response = client.get(reverse('posts:profile', args=['author']))
+        self.assertContains(response, 'Новый пост')
+        cache.clear()
+        response = Client().get(reverse('posts:profile', args=['author']))
+        self.assertNotContains(response, 'Новый пост')
+
+    def test_replicas_are_not_migrated(self):
+        """Миграции применяются только к основной базе"""
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate(REPLICA, 'posts'))
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core.backends.sqlite3.base import DatabaseWrapper
+from core.sqlite import stress
+
+User = get_user_model()
+
+
+class SQLitePragmasTest(TestCase):
+    def test_pragmas_are_applied(self):
+        """Соединение получает PRAGMA из настроек"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout']
+            )
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class ImmediateTransactionTest(TransactionTestCase):
+    def test_atomic_takes_write_lock_upfront(self):
+        """Транзакция сразу берет блокировку записи"""
+        executed = []
+
+        def record(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            with transaction.atomic():
+                User.objects.count()
+        self.assertEqual(executed[0], 'BEGIN IMMEDIATE')
+
+
+class ForkedConnectionTest(SimpleTestCase):
+    def test_connection_from_parent_process_is_dropped(self):
+        """Соединение, унаследованное после fork, не переиспользуется"""
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper(
+                {
+                    **connection.settings_dict,
+                    'NAME': os.path.join(directory, 'forked.sqlite3'),
+                },
+                alias='forked',
+            )
+            wrapper.ensure_connection()
+            inherited = wrapper.connection
+            wrapper.pid = -1
+            wrapper.close_if_unusable_or_obsolete()
+            self.assertIsNone(wrapper.connection)
+            inherited.close()
+
+
+class StressTest(SimpleTestCase):
+    def test_tuned_sqlite_has_no_lock_errors(self):
+        """Под конкурентной записью настроенная база не отдает locked"""
+        with tempfile.TemporaryDirectory() as directory:
+            locked, rate = stress(
+                os.path.join(directory, 'stress.sqlite3'),
+                workers=4,
+                writes=50,
+                pragmas=settings.SQLITE_PRAGMAS,
+            )
+        self.assertEqual(locked, 0)
+        self.assertGreater(rate, 0)
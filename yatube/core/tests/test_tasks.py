@@ -0,0 +1,114 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Task
+from core.tasks import Worker, requeue_stale, task
+
+User = get_user_model()
+
+calls = []
+
+
+@task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.urgent', priority=5)
+def urgent(value):
+    calls.append(value)
+
+
+@task(name='tests.batch', batch=3)
+def batched(items):
+    calls.append([item['value'] for item in items])
+
+
+@task(name='tests.broken', retries=1)
+def broken():
+    raise ValueError('сломано')
+
+
+@override_settings(TASK_RETRY_DELAY=10)
+class TaskQueueTest(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+        self.worker = Worker(threading.Event(), poll_interval=0)
+
+    def test_higher_priority_runs_first(self):
+        """Задача с большим приоритетом выполняется раньше"""
+        record.delay('обычная')
+        urgent.delay('срочная')
+        record.enqueue(('поздняя',), countdown=60)
+        while self.worker.run_once():
+            pass
+        self.assertEqual(calls, ['срочная', 'обычная'])
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_batch_task_receives_all_calls(self):
+        """Пакетная задача получает до batch вызовов за раз"""
+        for value in range(5):
+            batched.delay(value=value)
+        while self.worker.run_once():
+            pass
+        self.assertEqual(calls, [[0, 1, 2], [3, 4]])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_task_is_retried_with_backoff(self):
+        """Упавшая задача ждет повтора, после последней попытки — failed"""
+        broken.delay()
+        before = timezone.now()
+        self.worker.run_once()
+        item = Task.objects.get()
+        self.assertEqual(item.status, Task.QUEUED)
+        self.assertGreaterEqual(item.run_at, before + timedelta(seconds=10))
+        Task.objects.update(run_at=timezone.now())
+        self.worker.run_once()
+        item = Task.objects.get()
+        self.assertEqual(item.status, Task.FAILED)
+        self.assertEqual(item.attempts, 2)
+        self.assertIn('сломано', item.last_error)
+
+    def test_stale_task_is_requeued(self):
+        """Задачу упавшего воркера забирает другой"""
+        Task.objects.create(
+            name='tests.record',
+            payload='{"args": ["зависшая"], "kwargs": {}}',
+            status=Task.RUNNING,
+            run_at=timezone.now(),
+            locked_at=timezone.now() - timedelta(days=1),
+        )
+        self.assertEqual(requeue_stale(), 1)
+        self.worker.run_once()
+        self.assertEqual(calls, ['зависшая'])
+
+    def test_runworker_drains_queue(self):
+        """runworker --drain выполняет очередь в пуле потоков"""
+        for value in range(10):
+            record.delay(value)
+        # Общая база в памяти не пускает параллельных писателей,
+        # поэтому в тесте один поток.
+        call_command(
+            'runworker', concurrency=1, drain=True, stdout=StringIO()
+        )
+        self.assertEqual(sorted(calls), list(range(10)))
+        self.assertFalse(Task.objects.exists())
+
+    def test_password_reset_email_is_queued(self):
+        """Письмо сброса пароля уходит из очереди, а не из запроса"""
+        User.objects.create_user('reader', 'reader@example.com', 'pass')
+        Client().post(
+            reverse('users:password_reset'), {'email': 'reader@example.com'}
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        self.worker.run_once()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
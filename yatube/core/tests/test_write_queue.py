@@ -0,0 +1,124 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from posts.models import Comment, Follow, Post
+
+from core import write_queue
+from core.write_queue import Job, WriteQueue, WriteTimeout, write
+
+User = get_user_model()
+
+
+class WriteQueueTest(TransactionTestCase):
+    def test_jobs_are_committed_together(self):
+        """Задания из очереди коммитятся одной пачкой"""
+        writer = WriteQueue(batch_size=3, max_delay=1)
+        with self.assertLogs('core.write_queue', 'DEBUG') as logs:
+            futures = [
+                writer.submit(User.objects.create, username=f'user{number}')
+                for number in range(3)
+            ]
+            users = [future.result(timeout=5) for future in futures]
+        self.assertIn('jobs=3', logs.output[0])
+        self.assertEqual(
+            set(User.objects.values_list('pk', flat=True)),
+            {user.pk for user in users},
+        )
+
+    def test_failed_job_does_not_break_batch(self):
+        """Ошибка одного задания не откатывает остальные"""
+        User.objects.create(username='taken')
+        batch = [
+            Job(User.objects.create, (), {'username': 'first'}),
+            Job(User.objects.create, (), {'username': 'taken'}),
+            Job(User.objects.create, (), {'username': 'second'}),
+        ]
+        WriteQueue(batch_size=3, max_delay=0).commit(batch)
+        self.assertIsInstance(batch[1].future.exception(), IntegrityError)
+        self.assertEqual(batch[0].future.result().username, 'first')
+        self.assertEqual(batch[2].future.result().username, 'second')
+        self.assertEqual(User.objects.count(), 3)
+
+
+@override_settings(WRITE_QUEUE_ENABLED=True)
+class QueuedViewsTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='me')
+        self.author = User.objects.create(username='author')
+        self.post = Post.objects.create(text='Пост', author=self.author)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_user_reads_own_writes(self):
+        """После ответа запись уже видна следующему запросу"""
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Мой комментарий'},
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertContains(response, 'Мой комментарий')
+        self.client.post(reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.assertTrue(
+            Post.objects.filter(author=self.user, text='Новый пост').exists()
+        )
+        self.client.get(reverse('posts:profile_follow', args=['author']))
+        self.assertTrue(
+            Follow.objects.filter(user=self.user, author=self.author).exists()
+        )
+        self.assertEqual(Comment.objects.count(), 1)
+
+
+class IdleWriteQueue(WriteQueue):
+    """Очередь без потока-писателя: задания ждут, пока их не выполнят."""
+
+    def _start(self):
+        pass
+
+    def drain(self):
+        self.commit([self._jobs.get_nowait()])
+
+
+@override_settings(WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_TIMEOUT=0.05)
+class WriteTimeoutTest(TransactionTestCase):
+    def use(self, writer):
+        patcher = mock.patch.object(write_queue, 'writer', writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return writer
+
+    def test_pending_write_is_cancelled(self):
+        """Не начатая за таймаут запись отменяется и не выполняется"""
+        writer = self.use(IdleWriteQueue(batch_size=1, max_delay=0))
+        done = []
+        with self.assertRaises(WriteTimeout):
+            write(done.append, 'запись')
+        writer.drain()
+        self.assertEqual(done, [])
+
+    def test_started_write_is_awaited(self):
+        """Начатая запись дожидается коммита, а не падает по таймауту"""
+        self.use(WriteQueue(batch_size=1, max_delay=0))
+        self.assertEqual(
+            write(lambda: time.sleep(0.2) or 'готово'), 'готово'
+        )
+
+    def test_view_answers_service_unavailable(self):
+        """Отмененная запись вьюхи — ответ 503 без комментария"""
+        writer = self.use(IdleWriteQueue(batch_size=1, max_delay=0))
+        user = User.objects.create(username='me')
+        post = Post.objects.create(text='Пост', author=user)
+        client = Client()
+        client.force_login(user)
+        response = client.post(
+            reverse('posts:add_comment', args=[post.pk]), {'text': 'Ответ'}
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        writer.drain()
+        self.assertFalse(Comment.objects.exists())
@@ -1,5 +1,12 @@
+import hmac
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from core import metrics as collected
+
 
 def page_not_found(request, exception):
 
@@ -12,3 +19,25 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics(request):
+    """Метрики всех воркеров для Prometheus.
+
+    Нужны разрешенный адрес и заголовок Authorization: Bearer с
+    METRICS_TOKEN. Пока токен не задан, эндпоинт закрыт.
+    """
+    token = settings.METRICS_TOKEN
+    supplied = request.META.get('HTTP_AUTHORIZATION', '')
+    if (
+        request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS
+        or not token
+        or not hmac.compare_digest(
+            supplied.encode(), f'Bearer {token}'.encode()
+        )
+    ):
+        raise PermissionDenied
+    return HttpResponse(
+        collected.render(collected.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,162 @@
+"""Очередь записи: один поток-писатель и групповой коммит.
+
+SQLite пускает одного писателя за раз, и конкурентные запросы
+толкаются за блокировку. Когда WRITE_QUEUE_ENABLED включена, записи
+процесса выполняет один поток: он собирает до WRITE_QUEUE_BATCH_SIZE
+заданий (ждет не дольше WRITE_QUEUE_MAX_DELAY) и выполняет их в одной
+транзакции, каждое в своей точке сохранения. Обработчик запроса ждет
+future, который разрешается уже после коммита, поэтому следующий
+запрос пользователя видит свою запись.
+
+Если писатель не взялся за задание за WRITE_QUEUE_TIMEOUT, задание
+отменяется и запрос получает 503: запись не выполнена, и повтор ее не
+задвоит. Уже начатое задание дожидается коммита.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent import futures
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = futures.Future()
+
+
+class WriteTimeout(Exception):
+    """Запись не начата за WRITE_QUEUE_TIMEOUT и отменена."""
+
+
+class WriteQueue:
+    """Поток-писатель с групповым коммитом."""
+
+    def __init__(self, batch_size, max_delay):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, func, *args, **kwargs):
+        """Ставит запись в очередь и возвращает ее Future."""
+        job = Job(func, args, kwargs)
+        self._start()
+        self._jobs.put(job)
+        return job.future
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='write-queue', daemon=True
+                )
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._jobs.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._jobs.get(timeout=remaining))
+                else:
+                    batch.append(self._jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            self.commit(batch)
+
+    def commit(self, batch):
+        """Выполняет задания одной транзакцией.
+
+        Ошибка задания откатывает только его точку сохранения; ошибка
+        коммита достается всем заданиям пачки.
+        """
+        started = time.perf_counter()
+        # Отмененные по таймауту задания не выполняются.
+        batch = [
+            job for job in batch
+            if job.future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            return
+        results = []
+        try:
+            with transaction.atomic():
+                for job in batch:
+                    try:
+                        with transaction.atomic():
+                            results.append(
+                                (job, job.func(*job.args, **job.kwargs), None)
+                            )
+                    except Exception as error:
+                        results.append((job, None, error))
+        except Exception as error:
+            for job in batch:
+                job.future.set_exception(error)
+            return
+        for job, result, error in results:
+            if error is None:
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(error)
+        logger.debug(
+            'group commit jobs=%d time=%.2fms',
+            len(batch), (time.perf_counter() - started) * 1000
+        )
+
+
+writer = WriteQueue(
+    settings.WRITE_QUEUE_BATCH_SIZE, settings.WRITE_QUEUE_MAX_DELAY
+)
+
+
+def write(func, *args, **kwargs):
+    """Выполняет запись: через очередь или сразу в своей транзакции."""
+    if not settings.WRITE_QUEUE_ENABLED:
+        with transaction.atomic():
+            return func(*args, **kwargs)
+    future = writer.submit(func, *args, **kwargs)
+    try:
+        return future.result(timeout=settings.WRITE_QUEUE_TIMEOUT)
+    except futures.TimeoutError:
+        if future.cancel():
+            raise WriteTimeout()
+    # Писатель уже выполняет задание: без ожидания коммита повтор
+    # клиента задвоил бы запись.
+    return future.result()
+
+
+class WriteTimeoutMiddleware:
+    """Отвечает 503 на отмененную по таймауту запись."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, WriteTimeout):
+            return None
+        response = HttpResponse(
+            'Сервер перегружен, повторите запрос.', status=503
+        )
+        response['Retry-After'] = 1
+        return response
@@ -0,0 +1,47 @@
+"""Сценарии замера вьюх постов для команды benchmark."""
+from django.db.models import Count
+from django.urls import reverse
+
+from core.benchmarks import Scenario
+from posts.models import AuthorCounter, Group, Post
+
+
+def scenarios():
+    """Сценарии по самым тяжелым объектам текущей базы."""
+    group = Group.objects.annotate(
+        total=Count('posts')
+    ).order_by('-total', 'pk').first()
+    author = AuthorCounter.objects.select_related('user').order_by(
+        '-posts', 'pk'
+    ).first().user
+    reader = AuthorCounter.objects.select_related('user').order_by(
+        '-following', 'pk'
+    ).first().user
+    post = Post.objects.order_by('-comment_count', 'pk').first()
+    return [
+        Scenario('index', reverse('posts:index')),
+        Scenario(
+            'group_posts',
+            reverse('posts:group_posts', args=[group.slug])
+        ),
+        Scenario('profile', reverse('posts:profile', args=[author.username])),
+        Scenario(
+            'post_detail',
+            reverse('posts:post_detail', args=[post.pk])
+        ),
+        Scenario('follow_index', reverse('posts:follow_index'), user=reader),
+        Scenario(
+            'post_create',
+            reverse('posts:post_create'),
+            method='post',
+            data={'text': 'Замер', 'group': group.pk},
+            user=author,
+        ),
+        Scenario(
+            'add_comment',
+            reverse('posts:add_comment', args=[post.pk]),
+            method='post',
+            data={'text': 'Замер'},
+            user=reader,
+        ),
+    ]
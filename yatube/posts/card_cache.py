@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core import metrics
+from posts import thumbnails
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_key(post):
+    """Ключ карточки: id поста и время его последнего изменения."""
+    return f'post-card:{post.pk}:{post.updated.timestamp()}'
+
+
+def render_cards(posts):
+    """Карточки постов: одно обращение к кэшу на страницу.
+
+    Промахи рендерятся и кладутся в кэш одним set_many. Попадания
+    и промахи видны в /metrics как card_cache_total.
+    """
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cached = cache.get_many(keys)
+    # Миниатюры всех карточек без кэша — одним обращением к хранилищу.
+    prefetched = thumbnails.prefetch(
+        [post.image for post, key in zip(posts, keys) if key not in cached],
+        'card',
+    )
+    rendered = {}
+    cards = []
+    for post, key in zip(posts, keys):
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'thumbnails': prefetched}
+            )
+            rendered[key] = card
+        cards.append(mark_safe(card))
+    cache.set_many(rendered, settings.POST_CARD_CACHE_TTL)
+    metrics.inc('card_cache_total', {'result': 'hit'}, len(cached))
+    metrics.inc('card_cache_total', {'result': 'miss'}, len(rendered))
+    return cards
@@ -0,0 +1,154 @@
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F
+
+from posts.models import AuthorCounter, Comment, Follow, MediaFile, Post
+
+
+def counter_for(user):
+    """Счетчики пользователя; нулевые, если строки еще нет."""
+    try:
+        return user.counter
+    except AuthorCounter.DoesNotExist:
+        return AuthorCounter(user=user)
+
+
+def increment(user_id, field):
+    change = {field: F(field) + 1}
+    if not AuthorCounter.objects.filter(user_id=user_id).update(**change):
+        AuthorCounter.objects.get_or_create(user_id=user_id)
+        AuthorCounter.objects.filter(user_id=user_id).update(**change)
+
+
+def decrement(user_id, field):
+    AuthorCounter.objects.filter(
+        user_id=user_id, **{f'{field}__gt': 0}
+    ).update(**{field: F(field) - 1})
+
+
+def change_comment_count(post_id, delta, using=DEFAULT_DB_ALIAS):
+    """Меняет счетчик комментариев поста в базе using."""
+    posts = Post.objects.using(using).filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comment_count__gt=0)
+    posts.update(comment_count=F('comment_count') + delta)
+
+
+def retain_image(name):
+    """Добавляет ссылку на файл: два запроса, есть запись или нет."""
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name)], ignore_conflicts=True
+    )
+    MediaFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release_image(name):
+    """Снимает ссылку на файл; True, если ссылок не осталось."""
+    released = MediaFile.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+    return bool(released) and MediaFile.objects.filter(
+        name=name, refs=0
+    ).exists()
+
+
+def _counts(queryset, field):
+    return dict(
+        queryset.order_by().values(field).annotate(
+            total=Count('pk')
+        ).values_list(field, 'total')
+    )
+
+
+def _scattered_counts(queryset, field):
+    """_counts, сложенные по всем шардам."""
+    totals = Counter()
+    for shard in queryset.scatter():
+        totals.update(_counts(shard, field))
+    return totals
+
+
+def recount_authors(user_ids):
+    """Пересчитывает счетчики пользователей по всем шардам.
+
+    Возвращает число исправлений.
+    """
+    posts = _scattered_counts(
+        Post.objects.filter(author_id__in=user_ids), 'author_id'
+    )
+    followers = _scattered_counts(
+        Follow.objects.filter(author_id__in=user_ids), 'author_id'
+    )
+    following = _scattered_counts(
+        Follow.objects.filter(user_id__in=user_ids), 'user_id'
+    )
+    existing = AuthorCounter.objects.in_bulk(user_ids)
+    created = []
+    updated = []
+    for user_id in user_ids:
+        values = {
+            'posts': posts.get(user_id, 0),
+            'followers': followers.get(user_id, 0),
+            'following': following.get(user_id, 0),
+        }
+        counter = existing.get(user_id)
+        if counter is None:
+            created.append(AuthorCounter(user_id=user_id, **values))
+        elif any(getattr(counter, f) != v for f, v in values.items()):
+            for field, value in values.items():
+                setattr(counter, field, value)
+            updated.append(counter)
+    AuthorCounter.objects.bulk_create(created)
+    AuthorCounter.objects.bulk_update(
+        updated, ('posts', 'followers', 'following')
+    )
+    return len(created) + len(updated)
+
+
+def recount_comments(post_ids, using=DEFAULT_DB_ALIAS):
+    """Пересчитывает число комментариев постов из базы using.
+
+    Комментарии лежат в шарде своего поста, поэтому хватает одной базы.
+    """
+    comments = _counts(
+        Comment.objects.using(using).filter(post_id__in=post_ids), 'post_id'
+    )
+    posts = Post.objects.using(using).filter(pk__in=post_ids)
+    updated = []
+    for post in posts.only('comment_count'):
+        total = comments.get(post.pk, 0)
+        if post.comment_count != total:
+            post.comment_count = total
+            updated.append(post)
+    Post.objects.using(using).bulk_update(updated, ('comment_count',))
+    return len(updated)
+
+
+def recount_images():
+    """Пересчитывает ссылки на файлы картинок по всем шардам.
+
+    Возвращает число исправлений и имена файлов, на которые больше
+    не ссылается ни один пост.
+    """
+    refs = _scattered_counts(Post.objects.exclude(image=''), 'image')
+    existing = MediaFile.objects.in_bulk(list(refs))
+    created = []
+    updated = []
+    for name, total in refs.items():
+        media = existing.get(name)
+        if media is None:
+            created.append(MediaFile(name=name, refs=total))
+        elif media.refs != total:
+            media.refs = total
+            updated.append(media)
+    orphans = [
+        name for name in MediaFile.objects.filter(
+            refs__gt=0
+        ).values_list('name', flat=True)
+        if name not in refs
+    ]
+    updated += [MediaFile(name=name, refs=0) for name in orphans]
+    MediaFile.objects.bulk_create(created)
+    MediaFile.objects.bulk_update(updated, ('refs',))
+    return len(created) + len(updated), orphans
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'feed-generation:{}'
+SHARED = ('groups', 'authors')
+
+
+def _start(key):
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def generations(feeds):
+    """Текущие поколения лент одним обращением к кэшу.
+
+    Новое поколение начинается с текущего времени в наносекундах,
+    поэтому вытесненный из кэша счетчик не повторит старый ключ.
+    """
+    keys = [GENERATION_KEY.format(feed) for feed in feeds]
+    found = cache.get_many(keys)
+    return [found.get(key) or _start(key) for key in keys]
+
+
+def bump(*feeds):
+    """Сдвигает поколения лент, делая их кэш недоступным."""
+    for feed in feeds:
+        key = GENERATION_KEY.format(feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def feed_cache(feed, cursor):
+    """Параметры тега {% cache %} для страницы ленты."""
+    versions = generations((feed,) + SHARED)
+    return {
+        'key': ':'.join([feed, *map(str, versions), cursor or '']),
+        'ttl': settings.FEED_CACHE_TTL,
+    }
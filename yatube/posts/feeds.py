@@ -0,0 +1,295 @@
+import heapq
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import prefetch_related_objects
+
+from posts.models import AuthorCounter, Celebrity, FeedEntry, Follow, Post
+from posts.paginators import CursorPaginator
+from posts.sharding import colocated, shard_for
+
+logger = logging.getLogger(__name__)
+
+
+def is_celebrity(author_id):
+    return Celebrity.objects.filter(author_id=author_id).exists()
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Посты знаменитостей не раскладываются: их подтягивает
+    HybridFeedPaginator при чтении ленты.
+    """
+    started = time.perf_counter()
+    followers = Follow.objects.filter(author_id=post.author_id)
+    if colocated():
+        shards = [followers.filter(author__celebrity__isnull=True)]
+    elif is_celebrity(post.author_id):
+        shards = []
+    else:
+        # Подписчики автора лежат в шардах своих пользователей.
+        shards = followers.scatter()
+    entries = [
+        FeedEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for shard in shards
+        for user_id in shard.values_list('user_id', flat=True).iterator()
+    ]
+    FeedEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.FOLLOW_FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    logger.debug(
+        'fan-out post=%s followers=%d time=%.2fms',
+        post.pk, len(entries), (time.perf_counter() - started) * 1000
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.on_shard_of(author_id).filter(
+        author_id=author_id
+    ).order_by('-pub_date', '-pk').values_list(
+        'pk', 'pub_date'
+    )[:settings.FOLLOW_FEED_BACKFILL]
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        ),
+        batch_size=settings.FOLLOW_FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def drop_author(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def promote(author_id):
+    """Делает автора знаменитостью, когда подписчиков набралось
+    FOLLOW_FEED_CELEBRITY_THRESHOLD.
+    """
+    followers = AuthorCounter.objects.filter(
+        user_id=author_id
+    ).values_list('followers', flat=True).first() or 0
+    if followers >= settings.FOLLOW_FEED_CELEBRITY_THRESHOLD:
+        Celebrity.objects.get_or_create(author_id=author_id)
+
+
+def needs_demotion(author_id):
+    """Знаменитость, у которой подписчиков меньше
+    FOLLOW_FEED_CELEBRITY_DEMOTE_THRESHOLD.
+
+    Порог понижения ниже порога повышения: автор на границе не
+    переключается туда и обратно на каждой подписке и отписке.
+    """
+    followers = AuthorCounter.objects.filter(
+        user_id=author_id
+    ).values_list('followers', flat=True).first() or 0
+    return (
+        followers < settings.FOLLOW_FEED_CELEBRITY_DEMOTE_THRESHOLD
+        and is_celebrity(author_id)
+    )
+
+
+def demote(author_id):
+    """Снимает признак знаменитости и раскладывает посты автора.
+
+    Выполняется фоновой задачей: до нее посты автора по-прежнему
+    подтягиваются при чтении ленты. Признак снимается до раскладки,
+    поэтому новые посты либо раскладывает push_post, либо подхватывает
+    раскладка.
+    """
+    if not needs_demotion(author_id):
+        return
+    Celebrity.objects.filter(author_id=author_id).delete()
+    fan_out_author(author_id)
+
+
+def fan_out_author(author_id):
+    """Кладет последние FOLLOW_FEED_BACKFILL постов автора в ленты
+    всех его подписчиков.
+
+    С одним шардом — одним INSERT ... SELECT, не поднимая строки
+    в Python, иначе — по подписчику за раз.
+    """
+    if not colocated():
+        for followers in Follow.objects.filter(author_id=author_id).scatter():
+            for user_id in followers.values_list('user_id', flat=True):
+                backfill(user_id, author_id)
+        return
+    latest = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values('pk', 'pub_date')[:settings.FOLLOW_FEED_BACKFILL]
+    posts, params = latest.query.sql_with_params()
+    ops = connection.ops
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{ops.quote_name(FeedEntry._meta.db_table)} '
+        f'(user_id, post_id, author_id, pub_date) '
+        f'SELECT follow.user_id, post.id, %s, post.pub_date '
+        f'FROM {ops.quote_name(Follow._meta.db_table)} follow, '
+        f'({posts}) post '
+        f'WHERE follow.author_id = %s '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (author_id, *params, author_id))
+
+
+def rebuild_author(author_id):
+    """Заново раскладывает посты автора по лентам всех подписчиков.
+
+    Нужна после массовой загрузки в обход сигналов: выставляет признак
+    знаменитости и раскладывает посты через fan_out_author(). Работает
+    только с одним шардом.
+    """
+    followers = Follow.objects.filter(author_id=author_id).count()
+    if followers >= settings.FOLLOW_FEED_CELEBRITY_THRESHOLD:
+        Celebrity.objects.get_or_create(author_id=author_id)
+        return
+    Celebrity.objects.filter(author_id=author_id).delete()
+    if followers:
+        fan_out_author(author_id)
+
+
+def pulled_authors(user):
+    """Знаменитости из подписок пользователя по шардам их постов."""
+    follows = Follow.objects.on_shard_of(user.pk).filter(user=user)
+    if colocated():
+        author_ids = follows.filter(
+            author__celebrity__isnull=False
+        ).values_list('author_id', flat=True)
+    else:
+        author_ids = Celebrity.objects.filter(
+            author_id__in=list(follows.values_list('author_id', flat=True))
+        ).values_list('author_id', flat=True)
+    shards = defaultdict(list)
+    for author_id in author_ids:
+        shards[shard_for(author_id)].append(author_id)
+    return shards
+
+
+class FeedPaginator(CursorPaginator):
+    """Курсорный пагинатор по записям материализованной ленты.
+
+    С одним шардом посты приходят соединением с записями ленты,
+    иначе догружаются из шардов авторов одним запросом на шард,
+    а авторов и группы догружает HybridFeedPaginator.
+    """
+    keys = ('pub_date', 'post_id')
+
+    def __init__(self, object_list, per_page):
+        if colocated():
+            object_list = object_list.select_related(
+                'post__author', 'post__group'
+            )
+        super().__init__(object_list, per_page)
+
+    def prepare(self, rows):
+        if colocated():
+            return [entry.post for entry in rows]
+        shards = defaultdict(list)
+        for entry in rows:
+            shards[shard_for(entry.author_id)].append(entry.post_id)
+        posts = {}
+        for alias, post_ids in shards.items():
+            posts.update(Post.objects.using(alias).in_bulk(post_ids))
+        # Записи удаленных постов в другой базе пропускаются.
+        return [
+            posts[entry.post_id] for entry in rows if entry.post_id in posts
+        ]
+
+
+class MergedPaginator(CursorPaginator):
+    """Курсорный пагинатор поверх нескольких источников.
+
+    object_list — список CursorPaginator. Каждый источник отдает
+    не больше limit постов за курсором, после чего они сливаются
+    по (pub_date, id) и дедуплицируются. Связи related догружаются
+    один раз для всей страницы, а не в каждом источнике.
+    """
+
+    def __init__(self, object_list, per_page, related=()):
+        super().__init__(object_list, per_page)
+        self.related = related
+
+    def fetch(self, bound, descending, limit):
+        started = time.perf_counter()
+        streams = [
+            source.fetch(bound, descending, limit)
+            for source in self.object_list
+        ]
+        merged = heapq.merge(
+            *streams,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=descending
+        )
+        rows = []
+        seen = set()
+        for post in merged:
+            if post.pk in seen:
+                continue
+            seen.add(post.pk)
+            rows.append(post)
+            if len(rows) == limit:
+                break
+        prefetch_related_objects(rows, *self.related)
+        logger.debug(
+            'feed merge sources=%d rows=%d time=%.2fms',
+            len(streams), len(rows), (time.perf_counter() - started) * 1000
+        )
+        return rows
+
+
+def scattered(queryset, per_page):
+    """Пагинатор по выборке постов из всех шардов."""
+    related = queryset._prefetch_related_lookups
+    return MergedPaginator(
+        [
+            CursorPaginator(shard, per_page)
+            for shard in queryset.prefetch_related(None).scatter()
+        ],
+        per_page,
+        related,
+    )
+
+
+class HybridFeedPaginator(MergedPaginator):
+    """Лента подписок: протолкнутые записи плюс посты знаменитостей.
+
+    Посты знаменитостей подтягиваются из их шардов; у бывших обычных
+    авторов часть постов уже лежит в ленте, слияние их отбрасывает.
+    """
+
+    def __init__(self, user, per_page):
+        sources = [FeedPaginator(
+            FeedEntry.objects.filter(user=user), per_page
+        )]
+        for author_ids in pulled_authors(user).values():
+            posts = Post.objects.on_shard_of(author_ids[0]).filter(
+                author_id__in=author_ids
+            )
+            if colocated():
+                posts = posts.select_related('author', 'group')
+            sources.append(CursorPaginator(posts, per_page))
+        related = () if colocated() else ('author', 'group')
+        super().__init__(sources, per_page, related)
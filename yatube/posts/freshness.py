@@ -0,0 +1,96 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.db.models import OuterRef, Subquery
+
+from posts.feed_cache import SHARED, generations
+from posts.models import AuthorCounter, Comment, Group, Post
+from posts.sharding import colocated, post_shard
+
+User = get_user_model()
+
+
+def _etag(request, *parts):
+    viewer = request.user.pk if request.user.is_authenticated else 0
+    raw = ':'.join(map(str, (*parts, viewer)))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _feed_etag(request, feed):
+    return _etag(
+        request,
+        feed,
+        *generations((feed,) + SHARED),
+        request.GET.get('cursor', ''),
+    )
+
+
+def index_etag(request):
+    """ETag главной: только поколения из кэша, без запросов к БД."""
+    return _feed_etag(request, 'index')
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return _feed_etag(request, f'group:{group_id}')
+
+
+def profile_etag(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return _feed_etag(request, f'profile:{author_id}')
+
+
+def _post_state(request, post_id):
+    """Версия поста, последний комментарий и счетчик постов автора.
+
+    Один запрос на request: ETag и Last-Modified берут его отсюда.
+    Между шардами счетчик автора читается отдельным запросом к default.
+    """
+    if not hasattr(request, 'post_state'):
+        last_comment = Comment.objects.filter(
+            post=OuterRef('pk')
+        ).order_by('-created').values('created')[:1]
+        posts = Post.objects.filter(pk=post_id).annotate(
+            last_comment=Subquery(last_comment)
+        ).order_by()
+        fields = ('updated', 'last_comment', 'comment_count')
+        if colocated():
+            state = posts.values_list(
+                *fields, 'author__counter__posts'
+            ).first()
+        else:
+            state = None
+            shard = post_shard(post_id)
+            row = shard and posts.using(shard).values_list(
+                *fields, 'author_id'
+            ).first()
+            if row:
+                posts_count = AuthorCounter.objects.filter(
+                    user_id=row[-1]
+                ).values_list('posts', flat=True).first()
+                state = (*row[:-1], posts_count)
+        request.post_state = state
+    return request.post_state
+
+
+def post_etag(request, post_id):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    return _etag(request, 'post', *state, *generations(SHARED))
+
+
+def post_last_modified(request, post_id):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    updated, last_comment = state[:2]
+    return max(updated, last_comment or updated)
@@ -0,0 +1,101 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_databases, teardown_databases,
+)
+
+from core import benchmarks
+from posts.benchmarks import scenarios
+
+
+class Command(BaseCommand):
+    help = 'Замеряет вьюхи постов на наборах данных разного размера.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10000],
+            help='Число постов в каждом наборе данных.'
+        )
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--only', nargs='+', help='Замерять только эти сценарии.'
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не очищать кэш перед запросами.'
+        )
+        parser.add_argument('--baseline', default=settings.BENCHMARK_BASELINE)
+        parser.add_argument(
+            '--tolerance', type=float,
+            help='Допустимый рост любой метрики, доля от базовой линии. '
+                 'По умолчанию берется BENCHMARK_TOLERANCE.'
+        )
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Записать результаты как новую базовую линию.'
+        )
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(
+                DEBUG=False,
+                QUERY_BUDGET_ENABLED=False,
+                PROFILING_SAMPLE_RATE=0,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                results = {
+                    str(size): self.run_dataset(size, options)
+                    for size in options['sizes']
+                }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+        if options['update']:
+            benchmarks.save(options['baseline'], results)
+            self.stdout.write(f'Базовая линия: {options["baseline"]}')
+            return
+        tolerance = settings.BENCHMARK_TOLERANCE
+        if options['tolerance'] is not None:
+            tolerance = dict.fromkeys(tolerance, options['tolerance'])
+        regressions = benchmarks.compare(
+            benchmarks.load(options['baseline']), results, tolerance
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии:\n' + '\n'.join(regressions)
+            )
+
+    def run_dataset(self, size, options):
+        call_command('flush', interactive=False, verbosity=0)
+        call_command(
+            'seed',
+            users=max(50, size // 20),
+            groups=10,
+            posts=size,
+            comments=size,
+            follows=20,
+            seed=options['seed'],
+            stdout=self.stdout if options['verbosity'] > 1 else StringIO(),
+        )
+        client = Client()
+        results = {}
+        for scenario in scenarios():
+            if options['only'] and scenario.name not in options['only']:
+                continue
+            metrics = benchmarks.measure(
+                client, scenario, options['repeat'], options['warm']
+            )
+            results[scenario.name] = metrics
+            self.stdout.write(
+                f'{size:>8} {scenario.name:<14} '
+                f'p50 {metrics["p50_ms"]:8.2f} мс  '
+                f'p95 {metrics["p95_ms"]:8.2f} мс  '
+                f'запросов {metrics["queries"]:3}  '
+                f'память {metrics["memory_kb"]:9.1f} КБ'
+            )
+        return results
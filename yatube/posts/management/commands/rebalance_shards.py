@@ -0,0 +1,114 @@
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from posts.management.commands.seed import raw_dates
+from posts.models import Comment, Follow, Post, PostAuthor
+from posts.sharding import aliases, shard_for, start_sequence
+
+# Порядок вставки: комментарии ссылаются на посты.
+MODELS = (Post, Comment, Follow)
+LOOKUPS = {Post: 'author_id', Comment: 'post__author_id', Follow: 'user_id'}
+# Строк в одном INSERT или DELETE.
+CHUNK = 500
+
+
+def shard_keys(alias):
+    """Ключи шардирования, данные которых лежат в базе alias."""
+    return set(
+        Post.objects.using(alias).values_list('author_id', flat=True)
+    ) | set(
+        Follow.objects.using(alias).values_list('user_id', flat=True)
+    )
+
+
+def map_authors(alias):
+    """Заносит посты базы alias в карту PostAuthor, если их там нет."""
+    posts = Post.objects.using(alias).values_list('id', 'author_id')
+    rows = posts.iterator(chunk_size=CHUNK)
+    while True:
+        chunk = [
+            PostAuthor(post_id=post_id, author_id=author_id)
+            for post_id, author_id in islice(rows, CHUNK)
+        ]
+        if not chunk:
+            return
+        PostAuthor.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+            chunk, ignore_conflicts=True
+        )
+
+
+def move(key, source, target):
+    """Переносит посты, комментарии и подписки ключа из source в target.
+
+    Строки копируются с прежними id и датами и удаляются из source без
+    каскадов и сигналов: счетчики и ленты от переезда не меняются.
+    Копия коммитится в target раньше удаления из source, и уже
+    скопированные строки пропускаются: после сбоя между шагами ключ
+    лежит в обеих базах, и повторный запуск доводит перенос до конца.
+    """
+    rows = {
+        model: list(
+            model.objects.using(source).filter(**{LOOKUPS[model]: key})
+        )
+        for model in MODELS
+    }
+    with transaction.atomic(using=target), raw_dates(
+        Post._meta.get_field('pub_date'),
+        Post._meta.get_field('updated'),
+        Comment._meta.get_field('created'),
+    ):
+        for model in MODELS:
+            model.objects.using(target).bulk_create(
+                rows[model], ignore_conflicts=True
+            )
+    with transaction.atomic(using=source):
+        for model in reversed(MODELS):
+            ids = [row.pk for row in rows[model]]
+            for start in range(0, len(ids), CHUNK):
+                model.objects.using(source).filter(
+                    pk__in=ids[start:start + CHUNK]
+                )._raw_delete(source)
+    return Counter({model: len(rows[model]) for model in MODELS})
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты, комментарии и подписки в шарды их ключей, '
+        'заполняет карту авторов постов и счетчики id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--drain', nargs='+', default=[],
+            help='Базы, убранные из POST_SHARDS: их данные переносятся.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать ключи, которые нужно перенести.'
+        )
+
+    def handle(self, *args, **options):
+        moved = Counter()
+        keys = 0
+        for source in (*aliases(), *options['drain']):
+            if not options['dry_run']:
+                map_authors(source)
+            for key in sorted(shard_keys(source)):
+                target = shard_for(key)
+                if target == source:
+                    continue
+                keys += 1
+                if not options['dry_run']:
+                    moved += move(key, source, target)
+        if options['dry_run']:
+            self.stdout.write(f'Ключей к переносу: {keys}')
+            return
+        for model in MODELS:
+            start_sequence(model)
+        self.stdout.write(
+            f'Перенесено ключей {keys}: постов {moved[Post]}, '
+            f'комментариев {moved[Comment]}, подписок {moved[Follow]}'
+        )
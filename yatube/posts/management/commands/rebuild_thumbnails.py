@@ -0,0 +1,138 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+from posts.sharding import aliases
+
+
+def render_chunk(alias, rows, force):
+    """Задача процесса пула: миниатюры одной порции постов."""
+    # Посты могут делить одну картинку: режем ее один раз.
+    names = list(dict.fromkeys(row[1] for row in rows))
+    entries, failed = thumbnails.render(names, force)
+    return alias, rows, entries, failed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново режет миниатюры всех картинок постов в пуле процессов '
+        'и заполняет хранилище ключей sorl-thumbnail.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Число процессов; 1 — без пула.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument(
+            '--checkpoint', default=settings.THUMBNAIL_REBUILD_CHECKPOINT,
+            help='Файл, где запоминается последний обработанный пост.'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не читая контрольную точку.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перезаписать и уже существующие файлы миниатюр.'
+        )
+
+    def load_checkpoint(self):
+        """Последние id по шардам; точка от других размеров не годится."""
+        if self.options['restart']:
+            return {}
+        try:
+            with open(self.options['checkpoint']) as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if state.get('geometries') != self.geometries:
+            return {}
+        return state['shards']
+
+    def save_checkpoint(self, shards):
+        path = self.options['checkpoint']
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump({'geometries': self.geometries, 'shards': shards}, file)
+        os.replace(f'{path}.tmp', path)
+
+    def chunks(self, shards):
+        """Порции постов с картинками по возрастанию id в каждом шарде."""
+        for alias in aliases():
+            last = shards.get(alias, 0)
+            while True:
+                rows = list(
+                    Post.objects.using(alias).exclude(image='').filter(
+                        pk__gt=last
+                    ).order_by('pk').values_list(
+                        'pk', 'image', 'author_id', 'group_id'
+                    )[:self.options['chunk_size']]
+                )
+                if not rows:
+                    break
+                yield alias, rows
+                last = rows[-1][0]
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.geometries = json.loads(json.dumps(settings.POST_THUMBNAILS))
+        shards = self.load_checkpoint()
+        if shards:
+            self.stdout.write(f'Продолжаем с контрольной точки: {shards}')
+        processes = options['processes']
+        pool = multiprocessing.Pool(processes) if processes > 1 else None
+        pending = deque()
+        started = time.perf_counter()
+        self.done = self.failed = 0
+        try:
+            for alias, rows in self.chunks(shards):
+                args = (alias, rows, options['force'])
+                if pool is None:
+                    self.apply(shards, *render_chunk(*args))
+                    continue
+                pending.append(pool.apply_async(render_chunk, args))
+                # Результаты применяются по порядку, чтобы контрольная
+                # точка не обгоняла необработанные порции.
+                while len(pending) > 2 * processes or (
+                    pending and pending[0].ready()
+                ):
+                    self.apply(shards, *pending.popleft().get())
+            while pending:
+                self.apply(shards, *pending.popleft().get())
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        if os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Картинок: {self.done}, ошибок: {self.failed}, '
+            f'размеров: {len(settings.POST_THUMBNAILS)}, {elapsed:.2f} с, '
+            f'{self.done / elapsed if elapsed else 0:.1f} картинок в секунду'
+        )
+
+    def apply(self, shards, alias, rows, entries, failed):
+        """Пишет порцию в хранилище ключей и сдвигает контрольную точку."""
+        thumbnails.store(entries)
+        thumbnails.refresh(
+            [
+                Post(pk=pk, author_id=author_id, group_id=group_id)
+                for pk, _, author_id, group_id in rows
+            ],
+            alias,
+        )
+        shards[alias] = rows[-1][0]
+        self.save_checkpoint(shards)
+        if self.options['verbosity'] > 1:
+            self.stdout.write(f'{alias}: до id {shards[alias]}')
+        self.done += len(entries)
+        self.failed += len(failed)
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_authors, recount_comments, recount_images
+from posts.models import Post
+from posts.tasks import collect_image
+
+User = get_user_model()
+
+
+def chunks(queryset, size):
+    """Отдает списки pk порциями по size, двигаясь по ключу."""
+    last = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last).order_by('pk').values_list(
+                'pk', flat=True
+            )[:size]
+        )
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики порциями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        size = options['chunk_size']
+        fixed_authors = 0
+        for ids in chunks(User.objects.all(), size):
+            with transaction.atomic():
+                fixed_authors += recount_authors(ids)
+        fixed_posts = 0
+        for posts in Post.objects.scatter():
+            for ids in chunks(posts, size):
+                with transaction.atomic(using=posts.db):
+                    fixed_posts += recount_comments(ids, using=posts.db)
+        with transaction.atomic():
+            fixed_images, orphans = recount_images()
+            for name in orphans:
+                collect_image.delay(name=name)
+        self.stdout.write(
+            f'Исправлено счетчиков: пользователей {fixed_authors}, '
+            f'постов {fixed_posts}, картинок {fixed_images}'
+        )
@@ -0,0 +1,267 @@
+import io
+import multiprocessing
+import random
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from PIL import Image
+
+from posts import seeding
+from posts.feeds import rebuild_author
+from posts.models import Comment, Follow, Group, Post
+from posts.sharding import colocated
+
+User = get_user_model()
+
+IMAGE_POOL = 16
+
+
+@contextmanager
+def raw_dates(*fields):
+    """Отключает auto_now и auto_now_add, чтобы сохранить свои даты."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+def tasks(kind, total, size):
+    for number, start in enumerate(range(0, total, size)):
+        yield kind, number, start, min(size, total - start)
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими пользователями, постами, подписками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='Среднее число подписок на пользователя.'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель закона Ципфа для популярности авторов.'
+        )
+        parser.add_argument(
+            '--images', type=float, default=0,
+            help='Доля постов с картинкой, от 0 до 1.'
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed')
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Строк в одной порции генерации и одной транзакции.'
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счетчики и ленты подписок.'
+        )
+
+    def handle(self, *args, **options):
+        if not colocated():
+            raise CommandError(
+                'seed пишет в одну базу: заполните ее с POST_SHARDS = '
+                "['default'] и разнесите данные командой rebalance_shards."
+            )
+        self.options = options
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        rng = random.Random(options['seed'])
+
+        authors = self.create_users(prefix)
+        groups = self.create_groups(prefix)
+        images = self.create_images(prefix, rng)
+        before = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        values = {
+            'seed': options['seed'],
+            'authors': authors,
+            'groups': groups,
+            'images': images,
+            'image_share': options['images'],
+            'alpha': options['alpha'],
+            'follows': options['follows'],
+            'days': options['days'],
+            'now': timezone.now(),
+        }
+        self.run(values, tasks('posts', options['posts'], self.batch_size))
+        created = Post.objects.filter(pk__gt=before).aggregate(
+            first=Min('pk'), last=Max('pk')
+        )
+        if options['comments'] and created['first'] is not None:
+            values['post_range'] = (created['first'], created['last'])
+            self.run(
+                values,
+                tasks('comments', options['comments'], self.batch_size)
+            )
+        per_chunk = max(1, self.batch_size // max(1, int(options['follows'])))
+        self.run(values, tasks('follows', len(authors), per_chunk))
+
+        if not options['skip_derived']:
+            self.rebuild()
+        cache.clear()
+
+    def create_users(self, prefix):
+        started = time.perf_counter()
+        password = make_password(prefix)
+        User.objects.bulk_create(
+            (
+                User(username=f'{prefix}-{number}', password=password)
+                for number in range(self.options['users'])
+            ),
+            ignore_conflicts=True,
+        )
+        authors = list(
+            User.objects.filter(username__startswith=f'{prefix}-').order_by(
+                'pk'
+            ).values_list('pk', flat=True)
+        )
+        self.report('users', len(authors), started)
+        return authors
+
+    def create_groups(self, prefix):
+        started = time.perf_counter()
+        Group.objects.bulk_create(
+            (
+                Group(
+                    title=f'Группа {number}',
+                    slug=f'{prefix}-group-{number}',
+                    description=f'Описание группы {number}',
+                )
+                for number in range(self.options['groups'])
+            ),
+            ignore_conflicts=True,
+        )
+        groups = list(
+            Group.objects.filter(
+                slug__startswith=f'{prefix}-group-'
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        self.report('groups', len(groups), started)
+        return groups
+
+    def create_images(self, prefix, rng):
+        """Небольшой пул картинок, который делят между собой посты."""
+        if not self.options['images']:
+            return []
+        names = []
+        for number in range(IMAGE_POOL):
+            name = f'posts/{prefix}-{number}.png'
+            if not default_storage.exists(name):
+                color = tuple(rng.randrange(256) for _ in range(3))
+                buffer = io.BytesIO()
+                Image.new('RGB', (640, 480), color).save(buffer, 'PNG')
+                name = default_storage.save(
+                    name, ContentFile(buffer.getvalue())
+                )
+            names.append(name)
+        return names
+
+    def run(self, values, pending):
+        """Генерирует порции в процессах и пишет их в базу по порядку."""
+        started = time.perf_counter()
+        counts = {}
+        workers = self.options['workers']
+        if workers > 1:
+            pool = multiprocessing.Pool(
+                workers, initializer=seeding.init, initargs=(values,)
+            )
+            chunks = pool.imap(seeding.generate, pending)
+        else:
+            pool = None
+            seeding.init(values)
+            chunks = map(seeding.generate, pending)
+        try:
+            for kind, rows in chunks:
+                with transaction.atomic():
+                    getattr(self, f'save_{kind}')(rows)
+                counts[kind] = counts.get(kind, 0) + len(rows)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        for kind, count in counts.items():
+            self.report(kind, count, started)
+
+    def save_posts(self, rows):
+        with raw_dates(
+            Post._meta.get_field('pub_date'), Post._meta.get_field('updated')
+        ):
+            Post.objects.bulk_create(
+                (
+                    Post(
+                        text=text,
+                        author_id=author_id,
+                        group_id=group_id,
+                        pub_date=pub_date,
+                        updated=pub_date,
+                        image=image,
+                    )
+                    for text, author_id, group_id, pub_date, image in rows
+                ),
+            )
+
+    def save_comments(self, rows):
+        with raw_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create(
+                (
+                    Comment(
+                        text=text,
+                        post_id=post_id,
+                        author_id=author_id,
+                        created=created,
+                    )
+                    for text, post_id, author_id, created in rows
+                ),
+            )
+
+    def save_follows(self, rows):
+        Follow.objects.bulk_create(
+            (Follow(user_id=user, author_id=author) for user, author in rows),
+            ignore_conflicts=True,
+        )
+
+    def rebuild(self):
+        """Восстанавливает то, что при bulk_create делают сигналы."""
+        started = time.perf_counter()
+        call_command(
+            'recount', chunk_size=self.batch_size, stdout=self.stdout
+        )
+        self.report('counters', 1, started)
+        started = time.perf_counter()
+        authors = Follow.objects.order_by('author_id').values_list(
+            'author_id', flat=True
+        ).distinct()
+        rebuilt = 0
+        for author_id in list(authors):
+            with transaction.atomic():
+                rebuild_author(author_id)
+            rebuilt += 1
+        self.report('feeds', rebuilt, started)
+
+    def report(self, kind, count, started):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{kind}: {count} за {elapsed:.1f} с ({rate:.0f} в секунду)'
+        )
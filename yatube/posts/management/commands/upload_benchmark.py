@@ -0,0 +1,90 @@
+import io
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import (
+    override_settings, setup_databases, teardown_databases,
+)
+from django.urls import reverse
+from PIL import Image
+
+User = get_user_model()
+
+MIDDLEWARE = 'posts.uploads.ImageUploadMiddleware'
+
+
+def payloads():
+    """Отклоняемые загрузки: имя сценария, имя файла, содержимое."""
+    # PNG без сжатия: около 11 МБ, больше POST_UPLOAD_MAX_SIZE.
+    buffer = io.BytesIO()
+    Image.new('RGB', (2000, 1900), (90, 120, 200)).save(
+        buffer, 'PNG', compress_level=0
+    )
+    return (
+        ('не картинка, 5 МБ', 'notes.jpg', os.urandom(5 * 1024 * 1024)),
+        ('не картинка, 20 МБ', 'video.jpg', os.urandom(20 * 1024 * 1024)),
+        ('картинка 11 МБ', 'raw.png', buffer.getvalue()),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время воркера на отклоняемых загрузках с потоковой '
+        'проверкой ImageUploadHandler и без нее.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        # Отказы 413 пишутся в лог django.request на каждый запрос.
+        logging.disable(logging.WARNING)
+        try:
+            with tempfile.TemporaryDirectory() as media:
+                with override_settings(MEDIA_ROOT=media):
+                    self.compare(options['repeat'])
+        finally:
+            logging.disable(logging.NOTSET)
+            teardown_databases(old_config, verbosity=0)
+
+    def compare(self, repeat):
+        user = User.objects.create(username='uploader')
+        without = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+        for title, name, content in payloads():
+            # Тело кодируется заранее: замеряется только работа сервера.
+            body = encode_multipart(BOUNDARY, {
+                'text': 'Замер',
+                'image': SimpleUploadedFile(name, content),
+            })
+            timings = {}
+            for mode, middleware in (
+                ('без проверки', without), ('с проверкой', settings.MIDDLEWARE)
+            ):
+                with override_settings(MIDDLEWARE=middleware):
+                    client = Client()
+                    client.force_login(user)
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        response = client.generic(
+                            'POST', reverse('posts:post_create'), body,
+                            MULTIPART_CONTENT,
+                        )
+                    timings[mode] = (
+                        (time.perf_counter() - started) / repeat * 1000,
+                        response.status_code,
+                    )
+            (slow, slow_status), (fast, fast_status) = timings.values()
+            self.stdout.write(
+                f'{title:20} без проверки {slow:8.1f} мс ({slow_status})  '
+                f'с проверкой {fast:8.1f} мс ({fast_status})  '
+                f'экономия {slow - fast:8.1f} мс'
+            )
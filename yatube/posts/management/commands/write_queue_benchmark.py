@@ -0,0 +1,64 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_databases, teardown_databases,
+)
+
+from core.write_queue import write
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает запись комментариев напрямую и через очередь записи.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--writes', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            # Потокам нужна общая база в файле, а не в памяти.
+            database = settings.DATABASES['default']
+            database.setdefault('TEST', {})['NAME'] = os.path.join(
+                directory, 'write_queue.sqlite3'
+            )
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                author = User.objects.create(username='writer')
+                post = Post.objects.create(text='Пост', author=author)
+                for title, enabled in (('напрямую', False), ('очередь', True)):
+                    with override_settings(WRITE_QUEUE_ENABLED=enabled):
+                        rate = self.run(post, author, options)
+                    self.stdout.write(f'{title}: записей в секунду {rate:.0f}')
+            finally:
+                connection.close()
+                teardown_databases(old_config, verbosity=0)
+
+    def run(self, post, author, options):
+        def worker():
+            for _ in range(options['writes']):
+                write(
+                    Comment.objects.create,
+                    post=post, author=author, text='Комментарий',
+                )
+            connection.close()
+
+        threads = [
+            threading.Thread(target=worker) for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return options['threads'] * options['writes'] / elapsed
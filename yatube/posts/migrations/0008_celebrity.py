@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def promote_celebrities(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Celebrity = apps.get_model('posts', 'Celebrity')
+    authors = Follow.objects.values('author_id').annotate(
+        followers=models.Count('id')
+    ).filter(
+        followers__gte=settings.FOLLOW_FEED_CELEBRITY_THRESHOLD
+    ).values_list('author_id', flat=True)
+    Celebrity.objects.bulk_create(
+        Celebrity(author_id=author_id) for author_id in authors
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0007_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Celebrity',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='celebrity', serialize=False, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(promote_celebrities, migrations.RunPython.noop),
+    ]
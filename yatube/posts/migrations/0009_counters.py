@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorCounter = apps.get_model('posts', 'AuthorCounter')
+
+    def counts(queryset, field):
+        return dict(
+            queryset.order_by().values(field).annotate(
+                total=models.Count('pk')
+            ).values_list(field, 'total')
+        )
+
+    posts = counts(Post.objects.all(), 'author_id')
+    followers = counts(Follow.objects.all(), 'author_id')
+    following = counts(Follow.objects.all(), 'user_id')
+    AuthorCounter.objects.bulk_create(
+        (
+            AuthorCounter(
+                user_id=user_id,
+                posts=posts.get(user_id, 0),
+                followers=followers.get(user_id, 0),
+                following=following.get(user_id, 0),
+            )
+            for user_id in User.objects.values_list('pk', flat=True)
+        ),
+        batch_size=1000,
+    )
+    for post_id, total in counts(Comment.objects.all(), 'post_id').items():
+        Post.objects.filter(pk=post_id).update(comment_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0008_celebrity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts', models.PositiveIntegerField(default=0)),
+                ('followers', models.PositiveIntegerField(default=0)),
+                ('following', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardSequence',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('last', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_media_files'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostAuthor',
+            fields=[
+                ('post_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
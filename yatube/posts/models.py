@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from posts.sharding import ShardedModel, ShardQuerySet
+from posts.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -18,9 +21,10 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class Post(ShardedModel):
     text = models.TextField(verbose_name='Текст', help_text='Введите текст.')
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -33,22 +37,48 @@ class Post(models.Model):
         null=True,
         verbose_name='Группа',
         help_text='Введите группу.',
-        related_name='posts'
+        related_name='posts',
     )
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ShardQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('pub_date', 'id'), name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', 'pub_date', 'id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', 'pub_date', 'id'),
+                name='post_group_pub_date_idx'
+            ),
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # Прежние группа и картинка для сигналов сохранения.
+        loaded = dict(zip(field_names, values))
+        if 'group_id' in loaded and 'image' in loaded:
+            post.loaded_state = (loaded['group_id'], loaded['image'])
+        return post
 
     def __str__(self):
         return self.text[:15]
 
 
-class Comment(models.Model):
+class Comment(ShardedModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -57,16 +87,25 @@ class Comment(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='comments'
+        related_name='comments',
     )
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = ShardQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created'), name='comment_post_created_idx'
+            ),
+        )
+
     def __str__(self):
         return self.text[:15]
 
 
-class Follow(models.Model):
+class Follow(ShardedModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -76,6 +115,8 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following')
 
+    objects = ShardQuerySet.as_manager()
+
     class Meta:
         constraints = (
             models.UniqueConstraint(
@@ -85,7 +126,108 @@ class Follow(models.Model):
                 name='Unique user-author constraint'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'user'), name='follow_author_user_idx'
+            ),
+        )
 
     def __str__(self):
         return (f'Пользователь{self.user} подписан'
                 f' на пользователя {self.author}')
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=(
+                    'user', 'post'
+                ),
+                name='Unique user-post feed entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'pub_date', 'post'),
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'), name='feed_user_author_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'Лента {self.user_id}: пост {self.post_id}'
+
+
+class Celebrity(models.Model):
+    """Автор, чьи посты не раскладываются по лентам, а читаются при показе."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='celebrity')
+
+    def __str__(self):
+        return f'Знаменитость {self.author_id}'
+
+
+class AuthorCounter(models.Model):
+    """Денормализованные счетчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counter')
+    posts = models.PositiveIntegerField(default=0)
+    followers = models.PositiveIntegerField(default=0)
+    following = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'Счетчики {self.user_id}'
+
+
+class MediaFile(models.Model):
+    """Число постов, ссылающихся на файл картинки."""
+    name = models.CharField(max_length=100, primary_key=True)
+    refs = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.refs}'
+
+
+class ShardSequence(models.Model):
+    """Счетчик id шардированной модели, общий для всех шардов."""
+    name = models.CharField(max_length=100, primary_key=True)
+    last = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.last}'
+
+
+class PostAuthor(models.Model):
+    """Автор поста по его id: по нему находится шард поста."""
+    post_id = models.PositiveIntegerField(primary_key=True)
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+')
+
+    def __str__(self):
+        return f'Пост {self.post_id}: автор {self.author_id}'
@@ -0,0 +1,136 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import SimpleLazyObject
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(post, direction):
+    """Кодирует позицию поста в ленте в непрозрачный токен."""
+    raw = f'{direction}|{post.pub_date.isoformat()}|{post.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (направление, pub_date, pk) или None для битого токена."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница ленты, которая знает только своих соседей."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, 1, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[0], PREVIOUS)
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id).
+
+    Вместо номера страницы принимает токен курсора, поэтому обходится
+    без OFFSET и без COUNT(*): на страницу уходит один запрос
+    с LIMIT per_page + 1.
+    """
+    keys = ('pub_date', 'pk')
+
+    def _check_object_list_is_ordered(self):
+        """Порядок задают ключи курсора, а не object_list."""
+
+    def prepare(self, rows):
+        """Превращает строки выборки в объекты страницы."""
+        return rows
+
+    def _after(self, queryset, pub_date, pk):
+        date_field, id_field = self.keys
+        return queryset.filter(
+            Q(**{f'{date_field}__lte': pub_date}),
+            Q(**{f'{date_field}__lt': pub_date})
+            | Q(**{f'{id_field}__lt': pk})
+        )
+
+    def _before(self, queryset, pub_date, pk):
+        date_field, id_field = self.keys
+        return queryset.filter(
+            Q(**{f'{date_field}__gte': pub_date}),
+            Q(**{f'{date_field}__gt': pub_date})
+            | Q(**{f'{id_field}__gt': pk})
+        )
+
+    def fetch(self, bound, descending, limit):
+        """Возвращает до limit объектов ленты за границей bound."""
+        order = '-' if descending else ''
+        queryset = self.object_list.order_by(
+            *(f'{order}{key}' for key in self.keys)
+        )
+        if bound is not None:
+            if descending:
+                queryset = self._after(queryset, *bound)
+            else:
+                queryset = self._before(queryset, *bound)
+        return self.prepare(list(queryset[:limit]))
+
+    def page(self, cursor):
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            rows = self.fetch(None, True, self.per_page + 1)
+            return CursorPage(
+                rows[:self.per_page], self,
+                has_next=len(rows) > self.per_page, has_previous=False
+            )
+        direction, pub_date, pk = decoded
+        if direction == NEXT:
+            rows = self.fetch((pub_date, pk), True, self.per_page + 1)
+            return CursorPage(
+                rows[:self.per_page], self,
+                has_next=len(rows) > self.per_page, has_previous=True
+            )
+        rows = self.fetch((pub_date, pk), False, self.per_page + 1)
+        if len(rows) <= self.per_page:
+            return self.page(None)
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(rows, self, has_next=True, has_previous=True)
+
+    def get_page(self, cursor):
+        """Страница, которая читает базу при первом обращении.
+
+        Если фрагмент ленты уже в кэше, шаблон к странице не обращается
+        и запроса за постами нет.
+        """
+        return SimpleLazyObject(lambda: self.page(cursor))
@@ -0,0 +1,136 @@
+"""Генераторы синтетических данных для команды seed.
+
+Модуль не обращается к базе и не импортирует модели, поэтому его
+функции можно запускать в отдельных процессах. Каждая порция
+генерируется своим random.Random, зерно которого зависит только
+от общего зерна, вида данных и номера порции: результат не зависит
+от числа процессов.
+"""
+import bisect
+import itertools
+import random
+from datetime import timedelta
+
+WORDS = (
+    'лес', 'река', 'город', 'дорога', 'утро', 'вечер', 'письмо', 'книга',
+    'окно', 'дом', 'поезд', 'море', 'ветер', 'снег', 'дождь', 'солнце',
+    'работа', 'друг', 'кофе', 'чай', 'музыка', 'фильм', 'история', 'мысль',
+    'вопрос', 'ответ', 'сегодня', 'вчера', 'завтра', 'снова', 'очень',
+    'почти', 'всегда', 'никогда', 'тихо', 'быстро', 'медленно', 'хорошо',
+    'странно', 'интересно', 'пишет', 'читает', 'думает', 'смотрит', 'идет',
+    'видит', 'знает', 'помнит', 'любит', 'ждет', 'новый', 'старый',
+    'большой', 'маленький', 'первый', 'последний', 'светлый', 'темный',
+    'и', 'в', 'на', 'с', 'но', 'что', 'как', 'когда', 'потому', 'где',
+)
+
+# Параметры логнормального распределения длины текста в словах:
+# медиана около 25 слов, но встречаются и простыни на сотни слов.
+POST_WORDS = (3.2, 1.0, 600)
+COMMENT_WORDS = (2.0, 0.8, 80)
+
+context = {}
+
+
+def init(values):
+    """Сохраняет общие для всех порций параметры генерации."""
+    context.clear()
+    context.update(values)
+    authors = context['authors']
+    weights = [
+        1 / rank ** context['alpha'] for rank in range(1, len(authors) + 1)
+    ]
+    context['popular'] = list(itertools.accumulate(weights))
+    # Самые плодовитые авторы не обязательно самые читаемые:
+    # для постов используется свой порядок рангов.
+    posting = list(authors)
+    random.Random(f'{context["seed"]}:posting').shuffle(posting)
+    context['posting'] = posting
+
+
+def sentence(rng, params):
+    mu, sigma, limit = params
+    size = max(1, min(limit, int(rng.lognormvariate(mu, sigma))))
+    words = [rng.choice(WORDS) for _ in range(size)]
+    return ' '.join(words).capitalize() + '.'
+
+
+def moment(rng):
+    """Случайный момент за последние context['days'] дней."""
+    seconds = rng.uniform(0, context['days'] * 86400)
+    return context['now'] - timedelta(seconds=seconds)
+
+
+def popular_author(rng, authors):
+    """Автор с вероятностью, обратной степени его ранга (закон Ципфа)."""
+    popular = context['popular']
+    index = bisect.bisect_left(popular, rng.random() * popular[-1])
+    return authors[min(index, len(authors) - 1)]
+
+
+def posts(rng, size):
+    groups = context['groups']
+    images = context['images']
+    rows = []
+    for _ in range(size):
+        group = rng.choice(groups) if groups and rng.random() < 0.7 else None
+        image = ''
+        if images and rng.random() < context['image_share']:
+            image = rng.choice(images)
+        rows.append((
+            sentence(rng, POST_WORDS),
+            popular_author(rng, context['posting']),
+            group,
+            moment(rng),
+            image,
+        ))
+    return rows
+
+
+def comments(rng, size):
+    first, last = context['post_range']
+    authors = context['authors']
+    return [
+        (
+            sentence(rng, COMMENT_WORDS),
+            rng.randint(first, last),
+            rng.choice(authors),
+            moment(rng),
+        )
+        for _ in range(size)
+    ]
+
+
+def follows(rng, size, start):
+    """Подписки для пользователей authors[start:start + size].
+
+    Число подписок у пользователя распределено экспоненциально,
+    а выбор авторов следует закону Ципфа: несколько авторов
+    собирают большую часть подписчиков.
+    """
+    authors = context['authors']
+    rows = []
+    for user in authors[start:start + size]:
+        wanted = min(
+            len(authors) - 1,
+            int(rng.expovariate(1 / context['follows']))
+        ) if context['follows'] else 0
+        chosen = set()
+        for _ in range(wanted * 3):
+            if len(chosen) >= wanted:
+                break
+            author = popular_author(rng, authors)
+            if author != user:
+                chosen.add(author)
+        rows.extend((user, author) for author in sorted(chosen))
+    return rows
+
+
+def generate(task):
+    """Генерирует одну порцию строк: task = (вид, номер, начало, размер)."""
+    kind, number, start, size = task
+    rng = random.Random(f'{context["seed"]}:{kind}:{number}')
+    if kind == 'posts':
+        return kind, posts(rng, size)
+    if kind == 'comments':
+        return kind, comments(rng, size)
+    return kind, follows(rng, size, start)
@@ -0,0 +1,247 @@
+"""Шардирование постов, комментариев и подписок по автору.
+
+POST_SHARDS — список псевдонимов баз. Пост живет в шарде своего
+автора, комментарий — в шарде своего поста, подписка — в шарде
+подписчика. Шард ключа выбирает jump consistent hash: при добавлении
+шарда в конец списка переезжает только доля ключей, и переносит их
+команда rebalance_shards. Пользователи, группы, счетчики и ленты
+остаются в default.
+
+Пост по id ищется без перебора шардов: в default лежит карта id поста
+-> автор (PostAuthor), ее пишет сигнал создания поста. При переходе
+с одного шарда на несколько карту заполняет rebalance_shards.
+
+С одним шардом слой ничего не меняет: запросы те же, что и без него,
+и внешние ключи проверяются базой. С несколькими шардами ссылки
+ведут в другие базы, и бэкенд core.backends.sqlite3 их не проверяет.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import F, Max, Prefetch
+
+# Поле ключа шардирования; у комментария ключ — автор поста.
+SHARD_KEYS = {
+    'posts.post': 'author_id',
+    'posts.comment': 'post__author_id',
+    'posts.follow': 'user_id',
+}
+
+
+def aliases():
+    return settings.POST_SHARDS
+
+
+def colocated():
+    """Все данные в одной базе: можно соединять с пользователями."""
+    return list(aliases()) == [DEFAULT_DB_ALIAS]
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping, Veach): номер корзины для ключа."""
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * (1 << 31) / ((key >> 33) + 1))
+    return bucket
+
+
+def shard_for(key):
+    """Шард для ключа: id автора поста или подписчика."""
+    shards = aliases()
+    return shards[jump_hash(key, len(shards))]
+
+
+class ShardQuerySet(models.QuerySet):
+    def on_shard_of(self, key):
+        """Выборка из шарда ключа."""
+        if colocated():
+            return self
+        return self.using(shard_for(key))
+
+    def scatter(self):
+        """Та же выборка по одной на каждый шард."""
+        if colocated():
+            return [self]
+        return [self.using(alias) for alias in aliases()]
+
+    def by_post_id(self, post_id):
+        """get() поста по id из его шарда."""
+        if colocated():
+            return self.get(pk=post_id)
+        shard = post_shard(post_id)
+        if shard is None:
+            raise self.model.DoesNotExist(
+                f'{self.model._meta.object_name} matching query does not '
+                f'exist.'
+            )
+        return self.using(shard).get(pk=post_id)
+
+    def create(self, **kwargs):
+        """create() в шард ключа, если база не выбрана явно."""
+        if colocated() or self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=_stored_shard(self.model, obj))
+        return obj
+
+    def with_related(self, *fields):
+        """select_related в одной базе, prefetch_related между базами."""
+        if colocated():
+            return self.select_related(*fields)
+        lookups = []
+        for field in fields:
+            # Дальше первой связи все лежит в одной базе: author__counter
+            # догружается одним запросом с JOIN, а не двумя.
+            name, _, rest = field.partition('__')
+            related = self.model._meta.get_field(name).related_model
+            queryset = related._default_manager.all()
+            if rest:
+                queryset = queryset.select_related(rest)
+            lookups.append(Prefetch(name, queryset=queryset))
+        return self.prefetch_related(*lookups)
+
+
+class ShardedModel(models.Model):
+    """Модель, чей id выдает общий счетчик next_id().
+
+    С несколькими шардами id новому объекту назначает сигнал до
+    сохранения, поэтому save() сразу вставляет строку, не пробуя
+    сначала UPDATE по этому id.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.pk is None and not colocated():
+            kwargs.setdefault('force_insert', True)
+        super().save(*args, **kwargs)
+
+
+def start_sequence(model):
+    """Ставит счетчик id модели не ниже наибольшего id во всех шардах."""
+    from posts.models import ShardSequence
+
+    name = model._meta.label_lower
+    last = max(
+        queryset.aggregate(last=Max('pk'))['last'] or 0
+        for queryset in model.objects.scatter()
+    )
+    sequences = ShardSequence.objects.db_manager(DEFAULT_DB_ALIAS)
+    _, created = sequences.get_or_create(name=name, defaults={'last': last})
+    if not created:
+        sequences.filter(name=name, last__lt=last).update(last=last)
+
+
+def next_id(model):
+    """Следующий id модели, единый для всех шардов.
+
+    Счетчик лежит в default. Заводит его rebalance_shards при переходе
+    на несколько шардов, а если его нет — первое обращение.
+    """
+    from posts.models import ShardSequence
+
+    name = model._meta.label_lower
+    sequences = ShardSequence.objects.db_manager(DEFAULT_DB_ALIAS)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        if not sequences.filter(name=name).update(last=F('last') + 1):
+            start_sequence(model)
+            sequences.filter(name=name).update(last=F('last') + 1)
+        return sequences.filter(name=name).values_list(
+            'last', flat=True
+        ).get()
+
+
+def post_author_key(post_id):
+    return f'post-author:{post_id}'
+
+
+def remember_author(post):
+    """Записывает автора нового поста в карту PostAuthor."""
+    from posts.models import PostAuthor
+
+    PostAuthor.objects.db_manager(DEFAULT_DB_ALIAS).create(
+        post_id=post.pk, author_id=post.author_id
+    )
+
+
+def forget_author(post_id):
+    from posts.models import PostAuthor
+
+    PostAuthor.objects.using(DEFAULT_DB_ALIAS).filter(pk=post_id).delete()
+    cache.delete(post_author_key(post_id))
+
+
+def post_shard(post_id):
+    """Шард поста по id или None, если такого поста нет.
+
+    Автор поста не меняется, поэтому он кэшируется без срока.
+    """
+    from posts.models import PostAuthor
+
+    key = post_author_key(post_id)
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = PostAuthor.objects.using(DEFAULT_DB_ALIAS).filter(
+            pk=post_id
+        ).values_list('author_id', flat=True).first()
+        if author_id is None:
+            return None
+        cache.set(key, author_id, None)
+    return shard_for(author_id)
+
+
+def _stored_shard(model, instance):
+    """Шард, где лежит или будет лежать объект шардированной модели."""
+    label = model._meta.label_lower
+    if label == 'posts.comment':
+        field = model._meta.get_field('post')
+        if field.is_cached(instance):
+            return _stored_shard(field.related_model, instance.post)
+        return post_shard(instance.post_id) or DEFAULT_DB_ALIAS
+    return shard_for(getattr(instance, SHARD_KEYS[label]))
+
+
+class ShardRouter:
+    """Отправляет шардированные модели в шард их ключа.
+
+    Остальные модели и запросы без подсказки остаются следующему
+    роутеру. Связанные выборки от шардированного объекта (post.comments,
+    comment.post) идут в его базу, посты пользователя (user.posts) —
+    в шард пользователя. Подписки на автора лежат во всех шардах:
+    их читают через Follow.objects.filter(...).scatter().
+    """
+
+    def _shard(self, model, hints):
+        if colocated() or model._meta.label_lower not in SHARD_KEYS:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._meta.label_lower in SHARD_KEYS:
+            # У несохраненного объекта _state.db мог выставить роутер
+            # по связанному пользователю, поэтому шард вычисляется.
+            if type(instance) is model and instance._state.adding:
+                return _stored_shard(model, instance)
+            return instance._state.db
+        if model._meta.label_lower == 'posts.post' and (
+            instance._meta.label_lower == settings.AUTH_USER_MODEL.lower()
+        ):
+            return shard_for(instance.pk)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *aliases()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
@@ -0,0 +1,211 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from posts import counters, feed_cache, feeds, sharding
+from posts.models import AuthorCounter, Comment, Follow, Group, Post
+from posts.tasks import collect_image, demote_celebrity, generate_thumbnails
+
+User = get_user_model()
+
+
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def touch_posts(**filters):
+    """Меняет версию карточек постов, не трогая их содержимое."""
+    for posts in Post.objects.filter(**filters).scatter():
+        posts.update(updated=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def create_counter(sender, instance, created, **kwargs):
+    if created:
+        AuthorCounter.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=User)
+def remember_names(sender, instance, update_fields, **kwargs):
+    instance.previous_names = None
+    if instance.pk is None:
+        return
+    if update_fields is None or set(NAME_FIELDS) & set(update_fields):
+        instance.previous_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_names(sender, instance, created, **kwargs):
+    previous = getattr(instance, 'previous_names', None)
+    current = tuple(getattr(instance, field) for field in NAME_FIELDS)
+    if created or previous is None or previous == current:
+        return
+    touch_posts(author=instance)
+    feed_cache.bump('authors')
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+@receiver(pre_save, sender=Follow)
+def assign_shard_id(sender, instance, **kwargs):
+    """Id из общего счетчика, чтобы он не повторялся в других шардах."""
+    if sharding.colocated() or instance.pk is not None:
+        return
+    instance.pk = sharding.next_id(sender)
+
+
+@receiver(pre_save, sender=Post)
+def map_post_author(sender, instance, **kwargs):
+    """Автор нового поста попадает в карту раньше самого поста."""
+    if sharding.colocated() or not instance._state.adding:
+        return
+    sharding.remember_author(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unmap_post_author(sender, instance, **kwargs):
+    if not sharding.colocated():
+        sharding.forget_author(instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, **kwargs):
+    previous = None
+    if not instance._state.adding:
+        # Загруженный из базы пост помнит прежнее состояние сам.
+        previous = getattr(instance, 'loaded_state', None) or (
+            Post.objects.using(instance._state.db).filter(
+                pk=instance.pk
+            ).values_list('group_id', 'image').first()
+        )
+    instance.previous_group_id, instance.previous_image = (
+        previous or (None, None)
+    )
+    # Ссылку на только что загруженный файл добавит хранилище.
+    instance.image_uploaded = bool(instance.image) and (
+        not instance.image._committed
+    )
+
+
+@receiver(post_save, sender=Post)
+def remember_saved(sender, instance, **kwargs):
+    instance.loaded_state = (instance.group_id, instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    group_ids = {
+        instance.group_id, getattr(instance, 'previous_group_id', None)
+    }
+    feed_cache.bump(
+        'index',
+        f'profile:{instance.author_id}',
+        *(f'group:{group_id}' for group_id in group_ids if group_id)
+    )
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance.previous_slug = None
+    if instance.pk is not None:
+        instance.previous_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_links(sender, instance, created, **kwargs):
+    feed_cache.bump(f'group:{instance.pk}')
+    if created or instance.previous_slug == instance.slug:
+        return
+    touch_posts(group=instance)
+    feed_cache.bump('groups')
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group(sender, instance, **kwargs):
+    touch_posts(group=instance)
+    feed_cache.bump('groups')
+
+
+@receiver(post_save, sender=Post)
+def queue_thumbnails(sender, instance, **kwargs):
+    """Новая картинка — миниатюры готовит фоновая задача."""
+    if instance.image and instance.image.name != instance.previous_image:
+        generate_thumbnails.delay(post_id=instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def push_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(instance.author_id, 'posts')
+        feeds.push_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.decrement(instance.author_id, 'posts')
+
+
+def release_image(name):
+    if name and counters.release_image(name):
+        collect_image.enqueue(
+            kwargs={'name': name}, countdown=settings.MEDIA_COLLECT_DELAY
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    if instance.image.name == instance.previous_image:
+        if getattr(instance, 'image_uploaded', False):
+            # Ту же картинку загрузили снова: ссылка от хранилища лишняя.
+            counters.release_image(instance.image.name)
+        return
+    if instance.image and not getattr(instance, 'image_uploaded', False):
+        counters.retain_image(instance.image.name)
+    release_image(instance.previous_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, using, **kwargs):
+    if created:
+        counters.change_comment_count(instance.post_id, 1, using)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, using, **kwargs):
+    counters.change_comment_count(instance.post_id, -1, using)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(instance.user_id, 'following')
+        counters.increment(instance.author_id, 'followers')
+        feeds.promote(instance.author_id)
+        feeds.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_feed(sender, instance, **kwargs):
+    counters.decrement(instance.user_id, 'following')
+    counters.decrement(instance.author_id, 'followers')
+    feeds.drop_author(instance.user_id, instance.author_id)
+    if feeds.needs_demotion(instance.author_id):
+        demote_celebrity.delay(author_id=instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_profile(sender, instance, **kwargs):
+    feed_cache.bump(f'profile:{instance.author_id}')
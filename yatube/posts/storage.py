@@ -0,0 +1,59 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — sha256 его содержимого.
+
+    Одинаковые загрузки попадают в один файл posts/ab/cd/<sha256>.ext и
+    делят одни миниатюры. Файл удаляется фоновой задачей collect_image,
+    когда на него не остается ссылок в posts.MediaFile.
+
+    Ссылку на файл добавляет само сохранение, до проверки, есть ли файл
+    на диске: collect_image удаляет файл только вместе со строкой с
+    нулем ссылок, поэтому после добавления ссылки файл уже не пропадет,
+    а если его успели удалить, он записывается заново.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым: совпадение имен — тот же файл.
+        return name
+
+    def _save(self, name, content):
+        from posts.counters import retain_image
+
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        os.makedirs(self.location, exist_ok=True)
+        # Хэш считается при записи во временный файл, за один проход.
+        descriptor, temporary = tempfile.mkstemp(
+            dir=self.location, prefix='.upload-'
+        )
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            digest = digest.hexdigest()
+            name = os.path.join(
+                directory, digest[:2], digest[2:4], f'{digest}{extension}'
+            ).replace('\\', '/')
+            retain_image(name)
+            path = self.path(name)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporary, self.file_permissions_mode)
+                # Параллельная запись того же содержимого безопасна:
+                # rename атомарен, а байты совпадают.
+                os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return name
@@ -0,0 +1,43 @@
+from django.db import transaction
+from sorl.thumbnail import delete
+
+from core.tasks import task
+from posts import feeds, thumbnails
+from posts.models import MediaFile, Post
+
+
+@task(batch=20)
+def generate_thumbnails(items):
+    """Готовит миниатюры постов и обновляет их карточки и ленты."""
+    ids = {item['post_id'] for item in items}
+    for posts in Post.objects.filter(pk__in=ids).scatter():
+        ready = []
+        for post in posts.only('pk', 'image', 'author_id', 'group_id'):
+            if post.image:
+                thumbnails.generate(post.image)
+                ready.append(post)
+        if ready:
+            thumbnails.refresh(ready, posts.db)
+
+
+@task()
+def collect_image(name):
+    """Удаляет файл картинки и его миниатюры, если ссылок не осталось.
+
+    Задача ставится с задержкой MEDIA_COLLECT_DELAY: повторная загрузка
+    того же файла за это время снова добавляет ссылку, и файл остается.
+    Файл удаляется в той же транзакции, что и строка: добавление ссылки
+    ждет ее коммита и после него записывает файл заново.
+    """
+    with transaction.atomic():
+        # DELETE ... WHERE refs = 0 проверяет ссылки уже под блокировкой
+        # строки: файл удаляется, только если строку удалил этот вызов.
+        if not MediaFile.objects.filter(name=name, refs=0).delete()[0]:
+            return
+        delete(thumbnails.source(name))
+
+
+@task()
+def demote_celebrity(author_id):
+    """Возвращает бывшую знаменитость в раскладку по лентам."""
+    feeds.demote(author_id)
@@ -0,0 +1,20 @@
+from django import template
+
+from posts import thumbnails
+from posts.card_cache import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts):
+    return render_cards(posts)
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, image, size='card'):
+    """Готовая миниатюра или заглушка, если фоновая задача не успела.
+
+    Карточки ленты получают миниатюры заранее, в словаре thumbnails.
+    """
+    return thumbnails.picture(image, size, context.get('thumbnails'))
@@ -0,0 +1,38 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import resolve
+
+from core.benchmarks import measure
+from core.query_budget import budget_of
+from posts.benchmarks import scenarios
+
+
+class BenchmarkScenariosTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed', users=20, groups=2, posts=50, comments=50, follows=3,
+            stdout=StringIO()
+        )
+
+    def test_scenarios_cover_views(self):
+        """Сценарии покрывают ленты, пост и формы"""
+        self.assertEqual(
+            [scenario.name for scenario in scenarios()],
+            [
+                'index', 'group_posts', 'profile', 'post_detail',
+                'follow_index', 'post_create', 'add_comment',
+            ],
+        )
+
+    def test_scenarios_respond_within_budget(self):
+        """Каждый сценарий отвечает без ошибок и укладывается в бюджет"""
+        client = Client()
+        for scenario in scenarios():
+            with self.subTest(scenario=scenario.name):
+                metrics = measure(client, scenario, 2)
+                budget = budget_of(resolve(scenario.url).func)
+                self.assertLessEqual(metrics['queries'], budget)
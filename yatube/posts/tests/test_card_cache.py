@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts import card_cache
+from posts.models import Group, Post
+
+from core import metrics
+
+User = get_user_model()
+
+
+def card_cache_counts():
+    """Попадания и промахи кэша карточек из метрик процесса."""
+    return {
+        labels['result']: value
+        for name, labels, value in metrics.registry.snapshot()
+        if name == 'card_cache_total'
+    }
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me', first_name='Лев')
+        cls.group = Group.objects.create(
+            title='Название',
+            slug='test_slug',
+            description='test_desc'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.post.refresh_from_db()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_card_is_reused_across_feeds(self):
+        """Карточка, отрендеренная для главной, берется из кэша в группе"""
+        self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.get(
+            reverse('posts:group_posts', args=[self.group.slug])
+        )
+        self.assertEqual(card_cache_counts(), {'hit': 1, 'miss': 1})
+
+    def test_post_edit_changes_card_version(self):
+        """Редактирование поста меняет ключ его карточки"""
+        old_key = card_cache.card_key(self.post)
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=[self.post.id]),
+            {'text': 'Новый текст', 'group': self.group.id}
+        )
+        self.post.refresh_from_db()
+        self.assertNotEqual(card_cache.card_key(self.post), old_key)
+        response = self.authorized_client.get(
+            reverse('posts:group_posts', args=[self.group.slug])
+        )
+        self.assertContains(response, 'Новый текст')
+
+    def test_author_rename_changes_card_version(self):
+        """Смена имени автора меняет ключ карточек его постов"""
+        old_key = card_cache.card_key(self.post)
+        self.user.first_name = 'Фёдор'
+        self.user.save()
+        self.post.refresh_from_db()
+        self.assertNotEqual(card_cache.card_key(self.post), old_key)
+
+    def test_last_login_does_not_touch_cards(self):
+        """Обновление last_login не сбрасывает карточки"""
+        old_key = card_cache.card_key(self.post)
+        self.user.save(update_fields=['last_login'])
+        self.post.refresh_from_db()
+        self.assertEqual(card_cache.card_key(self.post), old_key)
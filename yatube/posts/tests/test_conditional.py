@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+        cls.author = User.objects.create(username='him')
+        cls.group = Group.objects.create(
+            title='Название',
+            slug='test_slug',
+            description='test_desc'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_answer_not_modified(self):
+        """Неизменившиеся страницы отвечают 304"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.id]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.revalidate(self.authorized_client, url)
+                self.assertEqual(response.status_code, 304)
+
+    def test_index_revalidation_does_not_touch_database(self):
+        """Проверка свежести главной не делает запросов к БД"""
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_post_changes_feed_etags(self):
+        """Новый пост меняет ETag главной, группы и профиля"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+        )
+        etags = [self.guest_client.get(url)['ETag'] for url in urls]
+        Post.objects.create(text='Новый', author=self.author, group=self.group)
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_detail_etag(self):
+        """Новый комментарий меняет ETag страницы поста"""
+        url = reverse('posts:post_detail', args=[self.post.id])
+        etag = self.guest_client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='Ком')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_changes_profile_etag(self):
+        """Подписка меняет ETag профиля автора"""
+        url = reverse('posts:profile', args=[self.author.username])
+        etag = self.authorized_client.get(url)['ETag']
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        """Разные пользователи получают разные ETag"""
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.guest_client.get(url)['ETag'],
+            self.authorized_client.get(url)['ETag']
+        )
+
+    def test_post_detail_has_last_modified(self):
+        """Страница поста отдает Last-Modified"""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        self.assertIn('Last-Modified', response)
@@ -0,0 +1,82 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import AuthorCounter, Comment, Follow, Post
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+        cls.author = User.objects.create(username='him')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def counter(self, user):
+        return AuthorCounter.objects.get(user=user)
+
+    def test_post_create_and_delete_change_post_counter(self):
+        """Создание и удаление поста меняют счетчик постов автора"""
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Пост'}
+        )
+        self.assertEqual(self.counter(self.user).posts, 1)
+        Post.objects.get(author=self.user).delete()
+        self.assertEqual(self.counter(self.user).posts, 0)
+
+    def test_follow_and_unfollow_change_counters(self):
+        """Подписка и отписка меняют счетчики обоих пользователей"""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.assertEqual(self.counter(self.user).following, 1)
+        self.assertEqual(self.counter(self.author).followers, 1)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertEqual(self.counter(self.user).following, 0)
+        self.assertEqual(self.counter(self.author).followers, 0)
+
+    def test_add_comment_changes_comment_counter(self):
+        """Комментарий увеличивает счетчик комментариев поста"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=[post.id]),
+            {'text': 'Комментарий'}
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        Comment.objects.filter(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_profile_uses_counter(self):
+        """Профиль берет число постов и подписчиков из счетчиков"""
+        Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertEqual(response.context['count'], 1)
+        self.assertEqual(response.context['counter'].followers, 1)
+
+    def test_recount_fixes_drift(self):
+        """Команда recount исправляет разошедшиеся счетчики"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Ком')
+        AuthorCounter.objects.filter(user=self.author).update(posts=7)
+        Post.objects.filter(pk=post.pk).update(comment_count=5)
+        AuthorCounter.objects.filter(user=self.user).delete()
+        call_command('recount', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.counter(self.author).posts, 1)
+        self.assertEqual(self.counter(self.user).posts, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
@@ -1,20 +1,26 @@
-import shutil
-import tempfile
+import io
 
-from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from posts.forms import PostForm
 from posts.models import Group, Post
+from posts.uploads import NOT_IMAGE, TOO_LARGE
+
+from core.testing import TempMediaMixin
 
 User = get_user_model()
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PostsFormTests(TestCase):
+def encoded(size, image_format, **options):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+class PostsFormTests(TempMediaMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -30,11 +36,6 @@ class PostsFormTests(TestCase):
 
         cls.form = PostForm()
 
-    @classmethod
-    def tearDownClass(cls):
-        super().tearDownClass()
-        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
-
     def setUp(self):
 
         self.authorized_client = Client()
@@ -76,7 +77,7 @@ class PostsFormTests(TestCase):
             Post.objects.filter(
                 group=form_data['group'],
                 text=form_data['text'],
-                image__endswith=form_data['image'].name
+                image__endswith='.gif'
             ).exists()
         )
 
@@ -109,6 +110,132 @@ class PostsFormTests(TestCase):
             ).exists()
         )
 
+    def test_large_image_is_normalized(self):
+        """Большая картинка уменьшается и теряет EXIF"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        uploaded = SimpleUploadedFile(
+            'large.jpeg',
+            encoded((3000, 1000), 'JPEG', exif=exif.tobytes()),
+            content_type='image/jpeg',
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Большая картинка', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Большая картинка')
+        self.assertTrue(post.image.name.endswith('.jpeg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (2048, 683))
+            self.assertFalse(image.getexif())
+
+    def test_other_formats_become_jpeg(self):
+        """BMP перекодируется в JPEG"""
+        form = PostForm(
+            {'text': 'BMP'},
+            {'image': SimpleUploadedFile(
+                'picture.bmp', encoded((20, 10), 'BMP')
+            )},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        image = form.cleaned_data['image']
+        self.assertEqual(image.name, 'picture.jpg')
+        self.assertEqual(Image.open(image).format, 'JPEG')
+
+    def test_color_profile_follows_color_model(self):
+        """Профиль RGB сохраняется, профиль CMYK уходит вместе с CMYK"""
+        for mode, profile, kept in (
+            ('RGB', b'rgb profile', True),
+            ('CMYK', b'cmyk profile', False),
+        ):
+            buffer = io.BytesIO()
+            Image.new(mode, (20, 10)).save(
+                buffer, 'JPEG', icc_profile=profile
+            )
+            form = PostForm(
+                {'text': mode},
+                {'image': SimpleUploadedFile(
+                    f'{mode}.jpeg', buffer.getvalue()
+                )},
+            )
+            self.assertTrue(form.is_valid(), form.errors)
+            with Image.open(form.cleaned_data['image']) as image:
+                self.assertEqual(image.mode, 'RGB')
+                self.assertEqual(
+                    image.info.get('icc_profile') == profile, kept
+                )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=10)
+    def test_animation_keeps_all_frames(self):
+        """У анимированного GIF уменьшается каждый кадр"""
+        frames = [
+            Image.new('RGB', (40, 20), (shade, 0, 0)) for shade in (0, 200)
+        ]
+        buffer = io.BytesIO()
+        frames[0].save(
+            buffer, 'GIF', save_all=True, append_images=frames[1:],
+            duration=80, loop=0,
+        )
+        form = PostForm(
+            {'text': 'Анимация'},
+            {'image': SimpleUploadedFile('animation.gif', buffer.getvalue())},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.format, 'GIF')
+            self.assertEqual(image.size, (10, 5))
+            self.assertEqual(image.n_frames, 2)
+            self.assertEqual(image.info['duration'], 80)
+            image.seek(1)
+            self.assertEqual(
+                image.convert('RGB').getpixel((0, 0)), (200, 0, 0)
+            )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000 * 1000)
+    def test_decompression_bomb_is_rejected(self):
+        """Картинка с огромным числом пикселей отклоняется"""
+        form = PostForm(
+            {'text': 'Бомба'},
+            {'image': SimpleUploadedFile(
+                'bomb.png', encoded((2000, 2000), 'PNG')
+            )},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_non_image_is_rejected_while_streaming(self):
+        """Файл без сигнатуры картинки отбрасывается при загрузке"""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Не картинка', 'image': SimpleUploadedFile(
+                'notes.jpg', b'%PDF-1.4' + b'x' * 100_000
+            )},
+        )
+        self.assertFormError(response, 'form', 'image', NOT_IMAGE)
+        self.assertFalse(Post.objects.filter(text='Не картинка').exists())
+
+    @override_settings(POST_UPLOAD_MAX_SIZE=10_000)
+    def test_oversized_image_is_rejected_while_streaming(self):
+        """Файл больше лимита отбрасывается, не дочитываясь до конца"""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Большой файл', 'image': SimpleUploadedFile(
+                'large.png', encoded((400, 400), 'PNG', compress_level=0)
+            )},
+        )
+        self.assertFormError(response, 'form', 'image', TOO_LARGE)
+
+    @override_settings(
+        POST_UPLOAD_MAX_SIZE=10_000, DATA_UPLOAD_MAX_MEMORY_SIZE=10_000
+    )
+    def test_oversized_request_is_refused_before_reading(self):
+        """Запрос с большим Content-Length получает 413"""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'x' * 30_000},
+        )
+        self.assertEqual(response.status_code, 413)
+
 
 class CommentFormTests(TestCase):
     @classmethod
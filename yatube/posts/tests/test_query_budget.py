@@ -0,0 +1,158 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase
+from django.urls import reverse
+from PIL import Image
+from posts.models import Celebrity, Comment, Follow, Group, Post
+
+from core.testing import QueryBudgetMixin, TempMediaMixin
+
+User = get_user_model()
+
+
+def image(name, color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 1), color).save(buffer, 'GIF')
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), content_type='image/gif'
+    )
+
+
+class QueryBudgetTest(TempMediaMixin, QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+        cls.author = User.objects.create(username='him')
+        cls.group = Group.objects.create(
+            title='Название',
+            slug='test_slug',
+            description='test_desc'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def grow(self, size):
+        """Добавляет авторов, посты и комментарии."""
+        for i in range(size):
+            author = User.objects.create(username=f'author{i}')
+            Follow.objects.create(user=self.user, author=author)
+            Post.objects.create(
+                text=f'Пост {i}', author=author, group=self.group
+            )
+            Comment.objects.create(
+                post=self.post, author=author, text=f'Комментарий {i}'
+            )
+            Post.objects.create(text=f'Ещё {i}', author=self.author)
+
+    def read_urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.id]),
+            reverse('posts:follow_index'),
+            reverse('posts:post_create'),
+        )
+
+    def test_read_views_stay_within_budget_as_data_grows(self):
+        """Вьюхи чтения укладываются в бюджет при росте данных"""
+        for size in (0, 15):
+            self.grow(size)
+            for url in self.read_urls():
+                with self.subTest(url=url, size=size):
+                    self.assertWithinBudget(self.authorized_client, url)
+
+    def test_write_views_stay_within_budget(self):
+        """Вьюхи записи укладываются в бюджет"""
+        self.grow(15)
+        other = User.objects.create(username='other')
+        requests = (
+            (reverse('posts:post_create'), {'text': 'Новый'}),
+            (reverse('posts:add_comment', args=[self.post.id]),
+             {'text': 'Комментарий'}),
+            (reverse('posts:profile_follow', args=[other.username]), None),
+            (reverse('posts:profile_unfollow', args=[other.username]), None),
+        )
+        for url, data in requests:
+            with self.subTest(url=url):
+                method = 'get' if data is None else 'post'
+                self.assertWithinBudget(
+                    self.authorized_client, url, method, data
+                )
+        own_post = Post.objects.filter(author=self.user).first()
+        self.assertWithinBudget(
+            self.authorized_client,
+            reverse('posts:post_edit', args=[own_post.id]),
+            'post',
+            {'text': 'Правка'}
+        )
+
+    def feed_urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        )
+
+    def test_cursor_pages_stay_within_budget(self):
+        """Страницы по курсору вперед и назад укладываются в бюджет"""
+        self.grow(15)
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                page = self.authorized_client.get(url).context['page_obj']
+                url_next = f'{url}?cursor={page.next_cursor}'
+                self.assertWithinBudget(self.authorized_client, url_next)
+                page = self.authorized_client.get(
+                    url_next
+                ).context['page_obj']
+                self.assertWithinBudget(
+                    self.authorized_client,
+                    f'{url}?cursor={page.previous_cursor}',
+                )
+
+    def test_hybrid_feed_stays_within_budget(self):
+        """Лента с постами знаменитости укладывается в бюджет"""
+        self.grow(15)
+        Celebrity.objects.create(author=self.author)
+        url = reverse('posts:follow_index')
+        recorder = self.assertWithinBudget(self.authorized_client, url)
+        self.assertIn('posts_celebrity', ' '.join(recorder.queries))
+        page = self.authorized_client.get(url).context['page_obj']
+        self.assertWithinBudget(
+            self.authorized_client, f'{url}?cursor={page.next_cursor}'
+        )
+
+    def test_image_views_stay_within_budget(self):
+        """Создание и замена картинки и их страницы укладываются в бюджет"""
+        self.grow(15)
+        self.assertWithinBudget(
+            self.authorized_client,
+            reverse('posts:post_create'),
+            'post',
+            {'text': 'С картинкой', 'group': self.group.pk,
+             'image': image('small.gif', (255, 0, 0))},
+        )
+        post = Post.objects.get(text='С картинкой')
+        self.assertWithinBudget(
+            self.authorized_client,
+            reverse('posts:post_edit', args=[post.id]),
+            'post',
+            {'text': 'Другая картинка', 'group': self.group.pk,
+             'image': image('other.gif', (0, 0, 255))},
+        )
+        Follow.objects.create(user=self.author, author=self.user)
+        for url in (*self.read_urls(), *self.feed_urls(),
+                    reverse('posts:profile', args=[self.user.username]),
+                    reverse('posts:post_detail', args=[post.id])):
+            with self.subTest(url=url):
+                self.assertWithinBudget(self.authorized_client, url)
@@ -0,0 +1,91 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+from core.query_budget import QueryRecorder
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class QueryPlanTest(TestCase):
+    """EXPLAIN QUERY PLAN для запросов каждой вьюхи posts."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+        cls.group = Group.objects.create(
+            title='Название',
+            slug='test_slug',
+            description='test_desc'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='other', description='other'
+        )
+        authors = [User.objects.create(username=f'a{i}') for i in range(5)]
+        for i in range(60):
+            author = authors[i % len(authors)]
+            post = Post.objects.create(
+                text=f'Пост {i}',
+                author=author,
+                group=cls.group if i % 2 else cls.other_group,
+            )
+            Comment.objects.create(post=post, author=cls.user, text='Ком')
+        for author in authors[:3]:
+            Follow.objects.create(user=cls.user, author=author)
+        cls.author = authors[0]
+        cls.post = Post.objects.filter(author=cls.author).first()
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def plan(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlans(self, url, cursor=None):
+        data = {'cursor': cursor} if cursor else None
+        with QueryRecorder() as recorder:
+            self.authorized_client.get(url, data)
+        for sql, params in zip(recorder.queries, recorder.params):
+            if not sql.startswith('SELECT'):
+                continue
+            for step in self.plan(sql, params):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertIsNone(FULL_SCAN.match(step))
+                    self.assertNotIn(TEMP_SORT, step)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.id]),
+            reverse('posts:follow_index'),
+        )
+
+    def test_first_pages_use_indexes(self):
+        """Первые страницы лент читаются по индексам без сортировки"""
+        for url in self.urls():
+            self.assertIndexedPlans(url)
+
+    def test_next_pages_use_indexes(self):
+        """Страницы по курсору читаются по индексам без сортировки"""
+        for url in self.urls()[:3] + self.urls()[4:]:
+            page = self.authorized_client.get(url).context['page_obj']
+            self.assertIndexedPlans(url, page.next_cursor)
+            next_page = self.authorized_client.get(
+                url, {'cursor': page.next_cursor}
+            ).context['page_obj']
+            self.assertIndexedPlans(url, next_page.previous_cursor)
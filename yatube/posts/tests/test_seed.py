@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase
+from posts.models import AuthorCounter, Comment, FeedEntry, Follow, Post
+
+
+class SeedCommandTest(TestCase):
+    options = {
+        'users': 30,
+        'groups': 3,
+        'posts': 300,
+        'comments': 200,
+        'follows': 5,
+        'seed': 7,
+        'batch_size': 50,
+    }
+
+    def seed(self, **options):
+        call_command('seed', stdout=StringIO(), **{**self.options, **options})
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'author__username', 'group__slug', 'image'
+            )),
+            list(Follow.objects.order_by('pk').values_list(
+                'user__username', 'author__username'
+            )),
+            list(Comment.objects.order_by('pk').values_list(
+                'text', 'author__username', 'post__text'
+            )),
+        )
+
+    def clear(self):
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+
+    def test_creates_requested_rows(self):
+        """seed создает заданное число постов и комментариев"""
+        self.seed()
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(Follow.objects.exists())
+        dates = Post.objects.values_list('pub_date', flat=True)
+        self.assertGreater(len(set(dates)), 1)
+
+    def test_same_seed_gives_same_data(self):
+        """Одно зерно дает те же данные при любом числе процессов"""
+        self.seed()
+        first = self.snapshot()
+        self.clear()
+        self.seed(workers=2)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_rebuilds_counters_and_feeds(self):
+        """После seed счетчики и ленты подписок согласованы с данными"""
+        self.seed()
+        posts = dict(
+            Post.objects.order_by().values('author').annotate(
+                total=Count('pk')
+            ).values_list('author', 'total')
+        )
+        for counter in AuthorCounter.objects.all():
+            self.assertEqual(counter.posts, posts.get(counter.user_id, 0))
+        follow = Follow.objects.filter(author__posts__isnull=False).first()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=follow.user, author=follow.author
+        ).exists())
+        post = Post.objects.filter(comments__isnull=False).first()
+        self.assertEqual(post.comment_count, post.comments.count())
+
+    def test_follow_graph_is_skewed(self):
+        """Подписчики распределены по авторам неравномерно"""
+        self.seed(users=200, posts=0, comments=0, follows=10)
+        followers = sorted(
+            Follow.objects.values('author').annotate(
+                total=Count('pk')
+            ).values_list('total', flat=True),
+            reverse=True
+        )
+        self.assertGreater(followers[0], 5 * followers[len(followers) // 2])
@@ -0,0 +1,295 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import QuerySet
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin, add_database, remove_database
+from posts.models import (AuthorCounter, Comment, FeedEntry, Follow, Group,
+                          Post, PostAuthor)
+from posts.sharding import jump_hash, shard_for, start_sequence
+
+User = get_user_model()
+
+SHARDS = ['default', 'shard1', 'shard2']
+
+
+def stored_in(model, **lookups):
+    """Базы, в которых лежат строки модели."""
+    return [
+        alias for alias in SHARDS
+        if model.objects.using(alias).filter(**lookups).exists()
+    ]
+
+
+class JumpHashTest(TransactionTestCase):
+    def test_new_bucket_takes_keys_only_from_others(self):
+        """С новым шардом ключи переезжают только в него"""
+        moved = 0
+        for key in range(3000):
+            before, after = jump_hash(key, 2), jump_hash(key, 3)
+            if before != after:
+                self.assertEqual(after, 2)
+                moved += 1
+        self.assertAlmostEqual(moved / 3000, 1 / 3, delta=0.05)
+
+
+class ColocatedConstraintsTest(TransactionTestCase):
+    def test_foreign_keys_are_enforced_in_single_database(self):
+        """С одной базой пост без автора не сохраняется"""
+        with self.assertRaises(IntegrityError):
+            Post.objects.create(text='Сирота', author_id=10 ** 6)
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardingTest(QueryBudgetMixin, TransactionTestCase):
+    databases = set(SHARDS)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        for alias in SHARDS[1:]:
+            add_database(
+                alias, os.path.join(cls.directory.name, f'{alias}.sqlite3')
+            )
+        super().setUpClass()
+        # Соединение с default открыто до шардирования и проверяет
+        # внешние ключи: между базами они не выполняются.
+        connection.disable_constraint_checking()
+        for alias in SHARDS[1:]:
+            call_command('migrate', database=alias, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connection.enable_constraint_checking()
+        for alias in SHARDS[1:]:
+            remove_database(alias)
+        cls.directory.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        # Счетчики id заводит rebalance_shards при переходе на шарды.
+        for model in (Post, Comment, Follow):
+            start_sequence(model)
+        # По пользователю на каждый шард.
+        self.users = {}
+        number = 0
+        while len(self.users) < len(SHARDS):
+            user = User.objects.create(username=f'user{number}')
+            self.users.setdefault(shard_for(user.pk), user)
+            number += 1
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def test_posts_live_in_author_shard(self):
+        """Пост попадает в шард автора, id не повторяются"""
+        ids = []
+        for alias, user in self.users.items():
+            self.client_for(user).post(
+                reverse('posts:post_create'), {'text': f'Пост {alias}'}
+            )
+            post = Post.objects.using(alias).get(author=user)
+            self.assertEqual(stored_in(Post, pk=post.pk), [alias])
+            ids.append(post.pk)
+        self.assertEqual(len(set(ids)), len(SHARDS))
+
+    def test_index_merges_shards(self):
+        """Главная сливает посты всех шардов по дате"""
+        for round_ in range(2):
+            for alias, user in self.users.items():
+                Post.objects.create(text=f'{alias} {round_}', author=user)
+        response = Client().get(reverse('posts:index'))
+        page = response.context['page_obj'].object_list
+        self.assertEqual(len(page), 2 * len(SHARDS))
+        self.assertEqual(
+            [post.pub_date for post in page],
+            sorted((post.pub_date for post in page), reverse=True),
+        )
+        self.assertEqual({post.author for post in page}, set(
+            self.users.values()
+        ))
+
+    def test_comments_live_with_their_post(self):
+        """Комментарий лежит в шарде поста, а не своего автора"""
+        author = self.users['shard1']
+        reader = self.users['shard2']
+        post = Post.objects.create(text='Пост', author=author)
+        self.client_for(reader).post(
+            reverse('posts:add_comment', args=[post.pk]),
+            {'text': 'Комментарий'},
+        )
+        self.assertEqual(stored_in(Comment, post_id=post.pk), ['shard1'])
+        post = Post.objects.using('shard1').get(pk=post.pk)
+        self.assertEqual(post.comment_count, 1)
+        response = Client().get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertContains(response, 'Комментарий')
+
+    def test_recount_reads_every_shard(self):
+        """recount считает посты, подписки и комментарии во всех шардах"""
+        author = self.users['shard1']
+        reader = self.users['shard2']
+        post = Post.objects.create(text='Пост', author=author)
+        Comment.objects.create(post=post, author=reader, text='Комментарий')
+        Follow.objects.create(user=reader, author=author)
+        AuthorCounter.objects.update(posts=0, followers=0, following=0)
+        Post.objects.using('shard1').update(comment_count=0)
+        call_command('recount', chunk_size=1, stdout=StringIO())
+        counter = AuthorCounter.objects.get(user=author)
+        self.assertEqual((counter.posts, counter.followers), (1, 1))
+        self.assertEqual(AuthorCounter.objects.get(user=reader).following, 1)
+        post = Post.objects.using('shard1').get(pk=post.pk)
+        self.assertEqual(post.comment_count, 1)
+
+    def test_follow_feed_reads_across_shards(self):
+        """Подписка лежит в шарде подписчика, лента собирает посты"""
+        reader = self.users['default']
+        author = self.users['shard2']
+        client = self.client_for(reader)
+        client.get(reverse('posts:profile_follow', args=[author.username]))
+        self.assertEqual(stored_in(Follow, user=reader), ['default'])
+        Post.objects.create(text='Из шарда', author=author)
+        self.assertTrue(FeedEntry.objects.filter(user=reader).exists())
+        response = client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Из шарда')
+        response = client.get(reverse('posts:profile', args=[author.username]))
+        self.assertTrue(response.context['following'])
+        client.get(reverse('posts:profile_unfollow', args=[author.username]))
+        self.assertEqual(stored_in(Follow, user=reader), [])
+
+    @override_settings(FOLLOW_FEED_CELEBRITY_THRESHOLD=1,
+                       FOLLOW_FEED_CELEBRITY_DEMOTE_THRESHOLD=1)
+    def test_celebrity_posts_are_pulled_from_shard(self):
+        """Посты знаменитости подтягиваются из ее шарда"""
+        reader = self.users['shard1']
+        author = self.users['shard2']
+        client = self.client_for(reader)
+        client.get(reverse('posts:profile_follow', args=[author.username]))
+        Post.objects.create(text='Знаменитость', author=author)
+        self.assertFalse(FeedEntry.objects.exists())
+        response = client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Знаменитость')
+
+    def test_rebalance_moves_keys_to_new_shard(self):
+        """После добавления шарда данные переезжают по новому ключу"""
+        with override_settings(POST_SHARDS=SHARDS[:2]):
+            users = list(User.objects.all())
+            for user in users:
+                post = Post.objects.create(text='Пост', author=user)
+                Comment.objects.create(post=post, author=user, text='К')
+            for user, author in zip(users, users[1:]):
+                Follow.objects.create(user=user, author=author)
+        call_command('rebalance_shards', stdout=StringIO())
+        for user in users:
+            home = shard_for(user.pk)
+            self.assertEqual(stored_in(Post, author=user), [home])
+            self.assertEqual(
+                stored_in(Comment, post__author=user), [home]
+            )
+        moved = [user for user in users if shard_for(user.pk) == 'shard2']
+        self.assertTrue(moved)
+        post = Post.objects.using('shard2').filter(author=moved[0]).get()
+        response = Client().get(reverse('posts:post_detail', args=[post.pk]))
+        self.assertContains(response, 'Пост')
+        self.assertEqual(
+            sum(Follow.objects.using(alias).count() for alias in SHARDS),
+            len(users) - 1,
+        )
+
+    def test_rebalance_finishes_after_crash(self):
+        """Перенос, упавший после копирования, доводится повторным запуском"""
+        with override_settings(POST_SHARDS=SHARDS[:2]):
+            users = list(User.objects.all())
+            for user in users:
+                post = Post.objects.create(text='Пост', author=user)
+                Comment.objects.create(post=post, author=user, text='К')
+        with mock.patch.object(
+            QuerySet, '_raw_delete', side_effect=RuntimeError('сбой')
+        ), self.assertRaises(RuntimeError):
+            call_command('rebalance_shards', stdout=StringIO())
+        self.assertTrue(Post.objects.using('shard2').exists())
+        call_command('rebalance_shards', stdout=StringIO())
+        for user in users:
+            home = shard_for(user.pk)
+            self.assertEqual(stored_in(Post, author=user), [home])
+            self.assertEqual(
+                stored_in(Comment, post__author=user), [home]
+            )
+
+    def test_rebalance_maps_posts_from_single_database(self):
+        """Посты, созданные до шардирования, находятся по id после переноса"""
+        with override_settings(POST_SHARDS=['default']):
+            posts = [
+                Post.objects.create(text=f'Пост {alias}', author=user)
+                for alias, user in self.users.items()
+            ]
+        self.assertFalse(PostAuthor.objects.exists())
+        call_command('rebalance_shards', stdout=StringIO())
+        client = Client()
+        for post in posts:
+            response = client.get(
+                reverse('posts:post_detail', args=[post.pk])
+            )
+            self.assertContains(response, post.text)
+
+    def test_drain_empties_removed_shard(self):
+        """--drain переносит данные из выведенной базы"""
+        for user in self.users.values():
+            Post.objects.create(text='Пост', author=user)
+        with override_settings(POST_SHARDS=['default', 'shard2']):
+            call_command(
+                'rebalance_shards', drain=['shard1'], stdout=StringIO()
+            )
+            for user in self.users.values():
+                self.assertEqual(
+                    stored_in(Post, author=user), [shard_for(user.pk)]
+                )
+        self.assertFalse(Post.objects.using('shard1').exists())
+
+    def test_views_stay_within_budget(self):
+        """Вьюхи укладываются в бюджет и с несколькими шардами"""
+        reader = self.users['default']
+        client = self.client_for(reader)
+        group = Group.objects.create(title='Группа', slug='group')
+        for alias, user in self.users.items():
+            client.get(reverse('posts:profile_follow', args=[user.username]))
+            for number in range(3):
+                post = Post.objects.create(
+                    text=f'{alias} {number}', author=user, group=group
+                )
+                Comment.objects.create(post=post, author=reader, text='К')
+        post = Post.objects.using('shard2').first()
+        own_post = Post.objects.create(text='Свой', author=reader)
+        author = self.users['shard1']
+        cache.clear()
+        requests = (
+            (reverse('posts:index'), None),
+            (reverse('posts:group_posts', args=[group.slug]), None),
+            (reverse('posts:profile', args=[author.username]), None),
+            (reverse('posts:post_detail', args=[post.pk]), None),
+            (reverse('posts:follow_index'), None),
+            (reverse('posts:post_create'), {'text': 'Новый'}),
+            (reverse('posts:post_edit', args=[own_post.pk]),
+             {'text': 'Правка'}),
+            (reverse('posts:add_comment', args=[post.pk]),
+             {'text': 'Еще'}),
+            (reverse('posts:profile_unfollow', args=[author.username]),
+             None),
+            (reverse('posts:profile_follow', args=[author.username]), None),
+        )
+        for url, data in requests:
+            with self.subTest(url=url):
+                method = 'get' if data is None else 'post'
+                self.assertWithinBudget(client, url, method, data)
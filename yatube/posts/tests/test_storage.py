@@ -0,0 +1,117 @@
+import os
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Task
+from core.tasks import execute
+from core.testing import TempMediaMixin
+from posts.models import MediaFile, Post
+from posts.tasks import generate_thumbnails
+from posts.tests.test_thumbnails import gif
+from posts.thumbnails import picture
+
+User = get_user_model()
+
+
+class ContentAddressedStorageTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+
+    def post(self, name, shade=0):
+        return Post.objects.create(
+            text='Пост', author=self.user, image=gif(name, shade)
+        )
+
+    def collect(self):
+        tasks = Task.objects.filter(name__endswith='collect_image')
+        self.assertTrue(
+            all(task.run_at > timezone.now() for task in tasks)
+        )
+        execute(list(tasks))
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые загрузки — один файл и одни миниатюры"""
+        first, second = self.post('first.gif'), self.post('second.gif')
+        other = self.post('other.gif', shade=1)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertRegex(first.image.name, r'^posts/\w\w/\w\w/\w{64}\.gif$')
+        self.assertEqual(MediaFile.objects.get(name=first.image.name).refs, 2)
+        generate_thumbnails([{'post_id': first.pk}])
+        self.assertTrue(picture(second.image, 'card').url)
+
+    def test_file_is_collected_after_last_reference(self):
+        """Файл и миниатюры удаляются, когда на них не осталось ссылок"""
+        first, second = self.post('first.gif'), self.post('second.gif')
+        generate_thumbnails([{'post_id': first.pk}])
+        path = first.image.path
+        thumbnail = picture(first.image, 'card').url
+        first.delete()
+        self.assertFalse(Task.objects.filter(name__endswith='collect_image'))
+        second.delete()
+        self.collect()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(os.path.join(
+            settings.MEDIA_ROOT, thumbnail[len(settings.MEDIA_URL):]
+        )))
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_reupload_keeps_released_file(self):
+        """Повторная загрузка до сборки мусора сохраняет файл"""
+        post = self.post('first.gif')
+        path = post.image.path
+        post.delete()
+        self.post('again.gif')
+        self.collect()
+        self.assertTrue(os.path.exists(path))
+
+    def test_reused_file_is_retained_before_save_finishes(self):
+        """Сборка мусора между сохранением файла и поста его не удаляет"""
+        post = self.post('first.gif')
+        path = post.image.path
+        post.delete()
+        storage = Post._meta.get_field('image').storage
+        name = storage.save('posts/again.gif', gif('again.gif'))
+        self.assertEqual(name, post.image.name)
+        self.collect()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 1)
+
+    def test_same_image_uploaded_on_edit_keeps_one_reference(self):
+        """Повторная загрузка той же картинки в пост не добавляет ссылку"""
+        post = self.post('first.gif')
+        path = post.image.path
+        post.image = gif('again.gif')
+        post.save()
+        self.assertEqual(MediaFile.objects.get(name=post.image.name).refs, 1)
+        post.delete()
+        self.collect()
+        self.assertFalse(os.path.exists(path))
+
+    def test_collected_file_is_written_again(self):
+        """Загрузка после сборки мусора снова записывает файл"""
+        post = self.post('first.gif')
+        path = post.image.path
+        post.delete()
+        self.collect()
+        self.assertFalse(os.path.exists(path))
+        again = self.post('again.gif')
+        self.assertEqual(again.image.path, path)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(MediaFile.objects.get(name=again.image.name).refs, 1)
+
+    def test_recount_restores_refs(self):
+        """recount пересчитывает ссылки на картинки"""
+        post = self.post('first.gif')
+        MediaFile.objects.all().delete()
+        MediaFile.objects.create(name='posts/lost.gif', refs=3)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(MediaFile.objects.get(name=post.image.name).refs, 1)
+        self.assertEqual(MediaFile.objects.get(name='posts/lost.gif').refs, 0)
@@ -0,0 +1,162 @@
+import io
+import json
+import os
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from core.models import Task
+from core.tasks import execute
+from core.testing import TempMediaMixin
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+
+def gif(name, shade=0):
+    """GIF 2x1; картинки разных оттенков различаются содержимым."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 1), (shade, 0, 0)).save(buffer, 'GIF')
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), content_type='image/gif'
+    )
+
+
+class ThumbnailTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def thumbnail_tasks(self):
+        return Task.objects.filter(name__endswith='thumbnails')
+
+    def run_tasks(self):
+        execute(list(self.thumbnail_tasks()))
+
+    def test_upload_queues_generation(self):
+        """Новая картинка ставит задачу, правка текста — нет"""
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост', 'image': gif('create.gif')},
+        )
+        post = Post.objects.get()
+        self.assertEqual(self.thumbnail_tasks().count(), 1)
+        self.run_tasks()
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]), {'text': 'Правка'}
+        )
+        self.assertFalse(self.thumbnail_tasks().exists())
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            {'text': 'Правка', 'image': gif('edit.gif', shade=1)},
+        )
+        self.assertEqual(self.thumbnail_tasks().count(), 1)
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """До готовности миниатюры страницы показывают заглушку"""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=gif('ready.gif')
+        )
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=[post.pk]),
+        )
+        for url in pages:
+            response = self.client.get(url)
+            self.assertContains(response, 'aspect-ratio: 960 / 339')
+            self.assertNotContains(response, '<img class="card-img')
+        self.run_tasks()
+        for url in pages:
+            response = self.client.get(url)
+            self.assertContains(response, '<img class="card-img')
+            self.assertContains(response, '320w, ')
+            self.assertNotContains(response, 'aspect-ratio')
+        self.assertContains(self.client.get(pages[0]), 'loading="lazy"')
+        self.assertNotContains(self.client.get(pages[1]), 'loading="lazy"')
+
+    @override_settings(POST_THUMBNAIL_MISSING_TTL=0)
+    def test_thumbnail_from_other_process_is_shown(self):
+        """Миниатюра, нарезанная другим процессом, сменяет заглушку"""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=gif('worker.gif')
+        )
+        url = reverse('posts:post_detail', args=[post.pk])
+        guest = Client()
+        self.assertContains(guest.get(url), 'aspect-ratio')
+        # Воркер пишет в базу и в свой кэш, а не в кэш этого процесса.
+        kvstore_cache = default.kvstore.cache
+        with mock.patch.object(kvstore_cache, 'set'), \
+                mock.patch.object(kvstore_cache, 'set_many'):
+            self.run_tasks()
+        self.assertContains(guest.get(url), '<img class="card-img')
+
+    def test_page_reads_kvstore_once(self):
+        """Миниатюры страницы ленты читаются одной выборкой"""
+        for number in range(5):
+            Post.objects.create(
+                text='Пост', author=self.user,
+                image=gif(f'page{number}.gif', shade=number),
+            )
+        self.run_tasks()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        lookups = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.assertContains(response, '<img class="card-img', count=5)
+
+    def rebuild(self, **options):
+        out = StringIO()
+        call_command(
+            'rebuild_thumbnails', processes=1, checkpoint=self.checkpoint,
+            stdout=out, **options
+        )
+        return out.getvalue()
+
+    def test_rebuild_fills_kvstore(self):
+        """rebuild_thumbnails готовит миниатюры и заполняет хранилище"""
+        self.checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+        posts = [
+            Post.objects.create(
+                text='Пост', author=self.user,
+                image=gif(f'{number}.gif', shade=number),
+            )
+            for number in range(3)
+        ]
+        Post.objects.create(text='Без картинки', author=self.user)
+        with open(self.checkpoint, 'w') as file:
+            json.dump({
+                'geometries': json.loads(
+                    json.dumps(settings.POST_THUMBNAILS)
+                ),
+                'shards': {'default': posts[0].pk},
+            }, file)
+        output = self.rebuild(chunk_size=1)
+        self.assertIn('Картинок: 2, ошибок: 0', output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+        cache.clear()
+        ready = [thumbnails.picture(post.image, 'card') for post in posts]
+        self.assertEqual(ready[0].url, '')
+        self.assertTrue(all(image.url for image in ready[1:]))
+        self.assertIn('Картинок: 3', self.rebuild())
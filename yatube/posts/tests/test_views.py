@@ -1,22 +1,22 @@
-import shutil
-import tempfile
-
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Group, Post
+from posts.models import Celebrity, FeedEntry, Follow, Group, Post
 
-User = get_user_model()
+from core.models import Task
+from core.tasks import execute
+from core.testing import TempMediaMixin
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PostsViewsTests(TestCase):
+class PostsViewsTests(TempMediaMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -71,11 +71,6 @@ class PostsViewsTests(TestCase):
             reverse('posts:post_create'): 'posts/create_post.html',
         }
 
-    @classmethod
-    def tearDownClass(cls):
-        super().tearDownClass()
-        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
-
     def setUp(self):
         self.guest_client = Client()
         self.authorized_client = Client()
@@ -216,23 +211,59 @@ class CacheTestView(TestCase):
                                        author=cls.user)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
     def test_index_cache(self):
         """Проверяет работу кэша."""
-        self.post.delete()
-        response_post_deleted = self.authorized_client.get(
-            reverse('posts:index')
-        )
+        first_response = self.authorized_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Другой текст')
+        cached_response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(first_response.content, cached_response.content)
         cache.clear()
-        response_post_deleted_cache_cleared = self.authorized_client.get(
-            reverse('posts:index')
+        fresh_response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotEqual(first_response.content, fresh_response.content)
+
+    def test_cached_index_does_not_query_posts(self):
+        """Закэшированная главная не читает посты из базы"""
+        self.authorized_client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse('posts:index'))
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if Post._meta.db_table in query['sql']
+        ])
+
+    def test_index_cache_invalidated_on_delete(self):
+        """Удаление поста сразу сбрасывает кэш главной"""
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.text)
+        self.post.delete()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, self.post.text)
+
+    def test_group_cache_invalidated_on_new_post(self):
+        """Новый пост сразу появляется на закэшированной странице группы"""
+        group = Group.objects.create(
+            title='Группа', slug='cached', description='Описание'
         )
-        self.assertNotEqual(
-            response_post_deleted.content,
-            response_post_deleted_cache_cleared.content
+        url = reverse('posts:group_posts', args=[group.slug])
+        self.authorized_client.get(url)
+        Post.objects.create(text='Свежий пост', author=self.user, group=group)
+        self.assertContains(self.authorized_client.get(url), 'Свежий пост')
+
+    def test_cache_varies_on_cursor(self):
+        """Вторая страница не отдает закэшированную первую"""
+        for i in range(settings.POSTS_PER_PAGE):
+            Post.objects.create(text=f'Пост номер {i}', author=self.user)
+        first_page = self.authorized_client.get(reverse('posts:index'))
+        second_page = self.authorized_client.get(
+            reverse('posts:index'),
+            {'cursor': first_page.context['page_obj'].next_cursor}
         )
+        self.assertNotContains(second_page, 'Пост номер 0')
+        self.assertContains(second_page, self.post.text)
 
 
 class PaginatorViewsTest(TestCase):
@@ -267,7 +298,11 @@ class PaginatorViewsTest(TestCase):
 
     def test_second_index_page_contains_three_records(self):
         """Вторая страница posts:index содержит 3 поста"""
-        response = self.client.get(reverse('posts:index') + '?page=2')
+        first_page = self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('posts:index'),
+            {'cursor': first_page.context['page_obj'].next_cursor}
+        )
         self.assertEqual(
             len(
                 response.context['page_obj']),
@@ -284,9 +319,12 @@ class PaginatorViewsTest(TestCase):
 
     def test_second_group_page_contains_three_records(self):
         """Вторая страница posts:group_posts содержит 3 поста"""
+        url = reverse('posts:group_posts',
+                      args=[PaginatorViewsTest.group.slug])
+        first_page = self.client.get(url)
         response = self.client.get(
-            reverse('posts:group_posts',
-                    args=[PaginatorViewsTest.group.slug]) + '?page=2')
+            url, {'cursor': first_page.context['page_obj'].next_cursor}
+        )
         self.assertEqual(
             len(
                 response.context['page_obj']),
@@ -302,14 +340,54 @@ class PaginatorViewsTest(TestCase):
 
     def test_second_profile_page_contains_three_records(self):
         """Вторая страница posts:profile содержит 3 поста"""
+        url = reverse('posts:profile',
+                      args=[PaginatorViewsTest.user.username])
+        first_page = self.client.get(url)
         response = self.client.get(
-            reverse('posts:profile',
-                    args=[PaginatorViewsTest.user.username]) + '?page=2')
+            url, {'cursor': first_page.context['page_obj'].next_cursor}
+        )
         self.assertEqual(
             len(
                 response.context['page_obj']),
             PaginatorViewsTest.NUMBER_OF_POSTS_FOR_SECOND_PAGE)
 
+    def test_previous_cursor_returns_first_page(self):
+        """Курсор назад со второй страницы возвращает первую"""
+        url = reverse('posts:index')
+        first_page = self.client.get(url).context['page_obj']
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertTrue(second_page.has_previous())
+        self.assertFalse(second_page.has_next())
+        back = self.client.get(
+            url, {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first_page))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдает первую страницу"""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), settings.POSTS_PER_PAGE
+        )
+
+    def test_pages_do_not_overlap(self):
+        """Страницы не пересекаются даже при одинаковой дате"""
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        url = reverse('posts:index')
+        first_page = self.client.get(url).context['page_obj']
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        ids = [post.id for post in first_page] + [
+            post.id for post in second_page
+        ]
+        self.assertEqual(len(set(ids)), Post.objects.count())
+
 
 class FollowViewsTests(TestCase):
     @classmethod
@@ -380,3 +458,144 @@ class FollowViewsTests(TestCase):
             response.context.get('page_obj').object_list)
 
         self.assertEqual(length, len_after_post_creation)
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+        cls.author = User.objects.create(username='him')
+        cls.old_post = Post.objects.create(text='Старый', author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_follow_backfills_feed(self):
+        """Подписка добавляет в ленту уже написанные посты"""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.user, post=self.old_post
+            ).exists()
+        )
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост раскладывается по лентам подписчиков"""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Новый', author=self.author)
+        entry = FeedEntry.objects.get(user=self.user, post=post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+
+    def test_unfollow_trims_feed(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+    def test_follow_index_reads_feed_with_one_query(self):
+        """Лента подписок читается одним запросом к материализованной
+        таблице
+        """
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [self.old_post]
+        )
+        with self.assertNumQueries(1):
+            response.context['page_obj'].paginator.page(None)
+
+
+@override_settings(
+    FOLLOW_FEED_CELEBRITY_THRESHOLD=3,
+    FOLLOW_FEED_CELEBRITY_DEMOTE_THRESHOLD=2,
+)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='me')
+        cls.fan = User.objects.create(username='fan')
+        cls.star = User.objects.create(username='star')
+        cls.author = User.objects.create(username='him')
+        cls.groupie = User.objects.create(username='groupie')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Follow.objects.create(user=cls.user, author=cls.star)
+        Follow.objects.create(user=cls.fan, author=cls.star)
+        Follow.objects.create(user=cls.groupie, author=cls.star)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_author_over_threshold_is_not_pushed(self):
+        """Посты знаменитости не раскладываются по лентам"""
+        post = Post.objects.create(text='Звезда', author=self.star)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+
+    def test_follow_index_merges_pushed_and_pulled_posts(self):
+        """Лента подписок сливает обычных авторов и знаменитостей по дате"""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=author)
+            for i, author in enumerate(
+                (self.author, self.star, self.author, self.star)
+            )
+        ]
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), posts[::-1]
+        )
+
+    def test_merged_feed_pages_do_not_overlap(self):
+        """Курсор проходит по слитой ленте без повторов"""
+        for i in range(settings.POSTS_PER_PAGE + 1):
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=self.star if i % 2 else self.author
+            )
+        url = reverse('posts:follow_index')
+        first_page = self.authorized_client.get(url).context['page_obj']
+        second_page = self.authorized_client.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(first_page), settings.POSTS_PER_PAGE)
+        self.assertEqual(len(second_page), 1)
+        self.assertNotIn(second_page[0], list(first_page))
+
+    def demotions(self):
+        return Task.objects.filter(name__endswith='demote_celebrity')
+
+    def test_author_near_threshold_keeps_status(self):
+        """Между порогами отписка и подписка не меняют статус автора"""
+        for _ in range(3):
+            Follow.objects.filter(user=self.groupie, author=self.star).delete()
+            Follow.objects.create(user=self.groupie, author=self.star)
+        Follow.objects.filter(user=self.groupie, author=self.star).delete()
+        self.assertTrue(Celebrity.objects.filter(author=self.star).exists())
+        self.assertFalse(self.demotions().exists())
+
+    def test_demoted_author_is_pushed_again(self):
+        """Потерявшая подписчиков знаменитость снова раскладывается"""
+        post = Post.objects.create(text='Звезда', author=self.star)
+        Follow.objects.filter(
+            user__in=(self.fan, self.groupie), author=self.star
+        ).delete()
+        # До фоновой задачи посты по-прежнему подтягиваются.
+        self.assertTrue(Celebrity.objects.filter(author=self.star).exists())
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        execute(list(self.demotions()))
+        self.assertFalse(Celebrity.objects.filter(author=self.star).exists())
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    def test_merge_is_logged(self):
+        """Слияние ленты и раскладка поста пишутся в лог"""
+        with self.assertLogs('posts.feeds', level='DEBUG') as logs:
+            Post.objects.create(text='Пост', author=self.author)
+            self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertTrue(any('fan-out' in line for line in logs.output))
+        self.assertTrue(any('feed merge' in line for line in logs.output))
@@ -0,0 +1,262 @@
+"""Миниатюры картинок постов.
+
+Все размеры из POST_THUMBNAILS готовит фоновая задача сразу после
+сохранения новой картинки. Шаблон только читает готовую миниатюру из
+хранилища ключей sorl-thumbnail и, пока ее нет, показывает заглушку
+того же размера: запрос страницы никогда не режет картинки сам.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import deserialize, serialize
+from sorl.thumbnail.images import (ImageFile, deserialize_image_file,
+                                   serialize_image_file)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.parsers import parse_geometry
+
+from core import metrics
+from core.profiling import timed
+from posts import feed_cache
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class Placeholder:
+    """Заглушка вместо еще не готовой миниатюры."""
+
+    url = ''
+
+    def __init__(self, geometry):
+        self.width, self.height = parse_geometry(geometry)
+
+
+def _options(source, options):
+    """Опции миниатюры так, как их дополняет sorl при генерации."""
+    backend = default.backend
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def source(name):
+    """Картинка поста в хранилище поля image."""
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def _thumbnail(source, size):
+    """Миниатюра размера size для картинки source, без генерации."""
+    geometry, options = settings.POST_THUMBNAILS[size]
+    return ImageFile(
+        default.backend._get_thumbnail_filename(
+            source, geometry, _options(source, options)
+        ),
+        default.storage,
+    )
+
+
+def _get_many(keys):
+    """Сырые значения хранилища ключей: кэш, затем один запрос в базу."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        kvstore.cache.set_many(
+            stored, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        # Отсутствие ключа запоминается ненадолго: миниатюру режет
+        # другой процесс, и его запись в кэш этого процесса не попадет.
+        kvstore.cache.set_many(
+            {key: EMPTY_VALUE for key in missing if key not in stored},
+            settings.POST_THUMBNAIL_MISSING_TTL,
+        )
+        found.update(stored)
+    return {
+        key: value for key, value in found.items()
+        if value is not None and value != EMPTY_VALUE
+    }
+
+
+def _variants(size):
+    return {size, *settings.POST_THUMBNAIL_SRCSET.get(size, ())}
+
+
+def _prefetch(images, size):
+    """Готовые миниатюры картинок одной выборкой из хранилища ключей.
+
+    Вместе с размером size читаются его варианты для srcset. Возвращает
+    словарь {(имя картинки, размер): миниатюра или заглушка}.
+    """
+    keys = {}
+    for name in {image.name for image in images if image}:
+        image = source(name)
+        for variant in _variants(size):
+            thumbnail = _thumbnail(image, variant)
+            keys[add_prefix(thumbnail.key)] = (name, variant)
+    values = _get_many(list(keys))
+    return {
+        (name, variant): (
+            deserialize_image_file(values[key]) if key in values
+            else Placeholder(settings.POST_THUMBNAILS[variant][0])
+        )
+        for key, (name, variant) in keys.items()
+    }
+
+
+prefetch = timed('thumbnail', _prefetch)
+
+
+class Picture:
+    """Миниатюра размера size и srcset из ее готовых вариантов."""
+
+    def __init__(self, name, size, prefetched):
+        thumbnail = prefetched[name, size]
+        self.url = thumbnail.url
+        self.width, self.height = thumbnail.width, thumbnail.height
+        variants = (
+            prefetched[name, variant]
+            for variant in settings.POST_THUMBNAIL_SRCSET.get(size, ())
+        )
+        self.srcset = ', '.join(
+            f'{variant.url} {variant.width}w'
+            for variant in variants if variant.url
+        )
+
+
+def picture(image, size, prefetched=None):
+    """Picture из prefetch() страницы или отдельной выборкой."""
+    if prefetched is None or (image.name, size) not in prefetched:
+        prefetched = prefetch([image], size)
+    return Picture(image.name, size, prefetched)
+
+
+def generate(image):
+    """Создает миниатюры всех размеров из POST_THUMBNAILS."""
+    for geometry, options in settings.POST_THUMBNAILS.values():
+        get_thumbnail(image, geometry, **options)
+    metrics.inc('thumbnails_generated_total', value=len(
+        settings.POST_THUMBNAILS
+    ))
+
+
+def refresh(posts, using):
+    """Новая версия постов вытесняет из кэша карточки с заглушкой."""
+    Post.objects.using(using).filter(
+        pk__in=[post.pk for post in posts]
+    ).update(updated=timezone.now())
+    keys = {'index'}
+    for post in posts:
+        keys.add(f'profile:{post.author_id}')
+        if post.group_id:
+            keys.add(f'group:{post.group_id}')
+    feed_cache.bump(*keys)
+
+
+def render(names, force=False):
+    """Режет миниатюры картинок names, не обращаясь к базе.
+
+    Выполняется в процессах пула rebuild_thumbnails. Готовые миниатюры
+    пропускает, если не задан force. Возвращает записи для store() и
+    имена картинок, которые не удалось открыть.
+    """
+    entries, failed = [], []
+    for name in names:
+        original = source(name)
+        source_image = None
+        thumbnails = []
+        try:
+            for size, (geometry, options) in settings.POST_THUMBNAILS.items():
+                thumbnail = _thumbnail(original, size)
+                options = _options(original, options)
+                if force or not thumbnail.exists():
+                    if source_image is None:
+                        source_image = default.engine.get_image(original)
+                        original.set_size(
+                            default.engine.get_image_size(source_image)
+                        )
+                    options['image_info'] = default.engine.get_image_info(
+                        source_image
+                    )
+                    default.backend._create_thumbnail(
+                        source_image, geometry, options, thumbnail
+                    )
+                    metrics.inc('thumbnails_generated_total')
+                else:
+                    thumbnail.set_size()
+                thumbnails.append(
+                    (thumbnail.key, serialize_image_file(thumbnail))
+                )
+            if original.size is None:
+                original.set_size()
+        except Exception:
+            logger.exception('thumbnail rebuild failed for %s', name)
+            failed.append(name)
+            continue
+        finally:
+            if source_image is not None:
+                default.engine.cleanup(source_image)
+        entries.append(
+            (original.key, serialize_image_file(original), thumbnails)
+        )
+    return entries, failed
+
+
+def store(entries):
+    """Записывает результаты render() в хранилище ключей sorl пачкой.
+
+    Для хранилища в базе — одно удаление и один bulk_create вместо
+    нескольких запросов на каждую миниатюру; списки миниатюр картинки
+    дополняются, а не затираются.
+    """
+    raw = {}
+    lists = {}
+    for source_key, source, thumbnails in entries:
+        raw[add_prefix(source_key)] = source
+        for key, thumbnail in thumbnails:
+            raw[add_prefix(key)] = thumbnail
+        lists[add_prefix(source_key, 'thumbnails')] = {
+            key for key, _ in thumbnails
+        }
+    if not isinstance(default.kvstore, KVStore):
+        for key, value in raw.items():
+            default.kvstore._set_raw(key, value)
+        for key, thumbnails in lists.items():
+            known = default.kvstore._get_raw(key)
+            thumbnails |= set(deserialize(known) if known else ())
+            default.kvstore._set_raw(key, serialize(sorted(thumbnails)))
+        return
+    for key, value in KVStoreModel.objects.filter(
+        key__in=list(lists)
+    ).values_list('key', 'value'):
+        lists[key] |= set(deserialize(value))
+    raw.update(
+        (key, serialize(sorted(thumbnails)))
+        for key, thumbnails in lists.items()
+    )
+    with transaction.atomic():
+        KVStoreModel.objects.filter(key__in=list(raw)).delete()
+        KVStoreModel.objects.bulk_create(
+            KVStoreModel(key=key, value=value) for key, value in raw.items()
+        )
+    default.kvstore.cache.set_many(
+        raw, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+    )
@@ -0,0 +1,209 @@
+"""Нормализация загруженных картинок постов.
+
+Оригинал не хранится: картинка уменьшается до POST_IMAGE_MAX_SIDE по
+большей стороне, поворачивается по EXIF и перекодируется без EXIF и
+прочих метаданных. JPEG, PNG и GIF сохраняют формат, остальные
+форматы становятся JPEG, а с прозрачностью — PNG. У анимации GIF,
+APNG или WebP уменьшается каждый кадр, и формат сохраняется.
+Картинка больше POST_IMAGE_MAX_PIXELS (у анимации — по всем кадрам)
+отклоняется по заголовку, до распаковки.
+
+Еще раньше, пока тело запроса читается, ImageUploadHandler проверяет
+сигнатуру и размер файла: не-картинка или файл больше
+POST_UPLOAD_MAX_SIZE отбрасываются, не дойдя до диска, а запрос с
+заведомо большим Content-Length получает 413 без чтения тела.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.http import HttpResponse
+from PIL import Image, ImageOps, ImageSequence
+
+# Сохраняемые форматы и их расширения.
+EXTENSIONS = {
+    'JPEG': ('.jpg', '.jpeg'),
+    'PNG': ('.png',),
+    'GIF': ('.gif',),
+    'WEBP': ('.webp',),
+}
+STILL_FORMATS = ('JPEG', 'PNG', 'GIF')
+# PNG здесь — APNG.
+ANIMATED_FORMATS = ('GIF', 'PNG', 'WEBP')
+
+
+def _output_format(image, animated):
+    if animated:
+        return image.format
+    if image.format in STILL_FORMATS:
+        return image.format
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        return 'PNG'
+    return 'JPEG'
+
+
+def _animation(image, side):
+    """Первый кадр и опции сохранения всех кадров, уменьшенных до side."""
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = frame.convert('RGBA')
+        frame.thumbnail((side, side), Image.LANCZOS)
+        frames.append(frame)
+    return frames[0], {
+        'save_all': True,
+        'append_images': frames[1:],
+        'duration': durations,
+        'loop': image.info.get('loop', 0),
+        # Кадры целые: перед следующим прежний стирается.
+        'disposal': 2,
+    }
+
+
+def normalize(upload):
+    """Уменьшенная и перекодированная копия загруженной картинки."""
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError('Картинка слишком большая.')
+    width, height = image.size
+    frames = getattr(image, 'n_frames', 1)
+    if width * height * frames > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError('Картинка слишком большая.')
+    # Многокадровый JPEG с камеры (MPO) — не анимация.
+    animated = (
+        getattr(image, 'is_animated', False)
+        and image.format in ANIMATED_FORMATS
+    )
+    output = _output_format(image, animated)
+    side = settings.POST_IMAGE_MAX_SIDE
+    icc_profile = image.info.get('icc_profile')
+    mode = image.mode
+    options = {'optimize': True}
+    if animated:
+        image, animation = _animation(image, side)
+        options.update(animation)
+    else:
+        # JPEG распаковывается сразу в уменьшенном масштабе.
+        image.draft('RGB', (side, side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((side, side), Image.LANCZOS)
+    if output == 'JPEG':
+        image = image.convert('RGB')
+        options.update(
+            quality=settings.POST_IMAGE_QUALITY, progressive=True
+        )
+    elif output == 'GIF' and not animated and 'transparency' in image.info:
+        options['transparency'] = image.info['transparency']
+    if icc_profile and image.mode == mode:
+        # Цветовой профиль — не метаданные: без него меняются цвета.
+        # Профиль другой цветовой модели (CMYK после перевода в RGB)
+        # испортил бы картинку, поэтому он отбрасывается.
+        options['icc_profile'] = icc_profile
+    buffer = io.BytesIO()
+    image.save(buffer, output, **options)
+    stem, extension = os.path.splitext(os.path.basename(upload.name))
+    if extension.lower() not in EXTENSIONS[output]:
+        extension = EXTENSIONS[output][0]
+    return SimpleUploadedFile(
+        f'{stem}{extension}',
+        buffer.getvalue(),
+        content_type=Image.MIME[output],
+    )
+
+
+# Сигнатуры форматов, которые умеет normalize(); WebP — отдельно.
+SIGNATURES = (
+    b'\xff\xd8\xff',
+    b'\x89PNG\r\n\x1a\n',
+    b'GIF87a',
+    b'GIF89a',
+    b'BM',
+)
+SNIFF_SIZE = 12
+TOO_LARGE = 'Файл слишком большой.'
+NOT_IMAGE = 'Загрузите картинку в формате JPEG, PNG, GIF, WebP или BMP.'
+
+
+def is_image(head):
+    """Начало файла похоже на картинку поддерживаемого формата."""
+    return head.startswith(SIGNATURES) or (
+        head[:4] == b'RIFF' and head[8:12] == b'WEBP'
+    )
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Отбрасывает не-картинки и слишком большие файлы на лету.
+
+    Стоит первым в цепочке: пропускает данные дальше, только пока файл
+    похож на картинку и не превысил лимит. Причину отказа записывает
+    в request.upload_errors, ее показывает форма.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.head = b''
+        if (self.content_length or 0) > settings.POST_UPLOAD_MAX_SIZE:
+            self.reject(TOO_LARGE)
+
+    def reject(self, message):
+        self.request.upload_errors[self.field_name] = message
+        raise SkipFile()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.POST_UPLOAD_MAX_SIZE:
+            self.reject(TOO_LARGE)
+        if len(self.head) < SNIFF_SIZE:
+            self.head += raw_data[:SNIFF_SIZE - len(self.head)]
+            if len(self.head) == SNIFF_SIZE and not is_image(self.head):
+                self.reject(NOT_IMAGE)
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Файл короче сигнатуры проверяется целиком.
+        if len(self.head) < SNIFF_SIZE and not is_image(self.head):
+            self.request.upload_errors[self.field_name] = NOT_IMAGE
+        return None
+
+
+def image_upload(view_func):
+    """Помечает вьюху, чью загрузку проверяет ImageUploadMiddleware."""
+    view_func.image_upload = True
+    return view_func
+
+
+def upload_errors(request):
+    return getattr(request, 'upload_errors', {})
+
+
+class ImageUploadMiddleware:
+    """Ставит ImageUploadHandler до того, как тело запроса прочитано.
+
+    Должна стоять выше CsrfViewMiddleware: та читает request.POST.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != 'POST' or not getattr(
+            view_func, 'image_upload', False
+        ):
+            return None
+        limit = (
+            settings.POST_UPLOAD_MAX_SIZE
+            + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        )
+        if int(request.META.get('CONTENT_LENGTH') or 0) > limit:
+            return HttpResponse('Файл слишком большой.', status=413)
+        request.upload_errors = {}
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+        return None
@@ -1,67 +1,100 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
 
+from core.query_budget import query_budget
+from core.write_queue import write
+from posts.counters import counter_for
+from posts.feed_cache import feed_cache
+from posts.feeds import HybridFeedPaginator, scattered
 from posts.forms import CommentForm, PostForm
+from posts.freshness import (group_etag, index_etag, post_etag,
+                             post_last_modified, profile_etag)
 from posts.models import Follow, Group, Post
+from posts.paginators import CursorPaginator
+from posts.uploads import image_upload, upload_errors
 
 User = get_user_model()
 
 
+def get_post_or_404(queryset, post_id):
+    """Пост по id из его шарда."""
+    try:
+        return queryset.by_post_id(post_id)
+    except Post.DoesNotExist:
+        raise Http404('Пост не найден.')
+
+
+@query_budget(5, sharded=2, per_shard=1)
+@condition(etag_func=index_etag)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.with_related('author', 'group')
+    paginator = scattered(post_list, settings.POSTS_PER_PAGE)
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(cursor)
     context = {
         'page_obj': page_obj,
+        'feed_cache': feed_cache('index', cursor),
     }
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(7, sharded=1, per_shard=1)
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.with_related('author')
+    paginator = scattered(post_list, settings.POSTS_PER_PAGE)
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(cursor)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_cache': feed_cache(f'group:{group.pk}', cursor),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(8, sharded=1)
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    count = author.posts.all().count()
+    author = get_object_or_404(
+        User.objects.select_related('counter'), username=username
+    )
+    post_list = author.posts.on_shard_of(author.pk).with_related('group')
+    paginator = CursorPaginator(post_list, settings.POSTS_PER_PAGE)
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(cursor)
+    counter = counter_for(author)
     following = False
     if request.user.is_authenticated:
-        following = Follow.objects.filter(
+        following = Follow.objects.on_shard_of(request.user.pk).filter(
             user=request.user, author=author
         ).exists()
     context = {
         'page_obj': page_obj,
         'author': author,
-        'count': count,
+        'count': counter.posts,
+        'counter': counter,
         'following': following,
-
+        'feed_cache': feed_cache(f'profile:{author.pk}', cursor),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(5, sharded=5)
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_post_or_404(
+        Post.objects.with_related('author__counter', 'group'), post_id
+    )
+    comments = post.comments.with_related('author').order_by('created')
     form = CommentForm(request.POST or None)
-    author = post.author
-    count = author.posts.all().count()
+    count = counter_for(post.author).posts
     context = {
         'form': form,
         'count': count,
@@ -71,28 +104,39 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def save_post(form, author):
+    post = form.save(commit=False)
+    post.author = author
+    form.save()
+    return post
+
+
+@image_upload
+@query_budget(10, sharded=4, per_shard=1)
 @login_required
 def post_create(request):
     if request.method != 'POST':
         form = PostForm()
         return render(request, 'posts/create_post.html', {'form': form})
     form = PostForm(request.POST or None,
-                    files=request.FILES or None)
+                    files=request.FILES or None,
+                    upload_errors=upload_errors(request))
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
-    post = form.save(commit=False)
-    post.author = request.user
-    form.save()
+    post = write(save_post, form, request.user)
     return redirect('posts:profile', post.author)
 
 
+@image_upload
+@query_budget(12, sharded=1)
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    if post.author != request.user:
+    post = get_post_or_404(Post.objects.all(), post_id)
+    if post.author_id != request.user.id:
         return redirect('posts:index')
     form = PostForm(request.POST or None,
-                    files=request.FILES or None, instance=post)
+                    files=request.FILES or None, instance=post,
+                    upload_errors=upload_errors(request))
     if request.method != 'POST':
         return render(request, 'posts/create_post.html', {'form': form,
                                                           'post': post,
@@ -101,50 +145,62 @@ def post_edit(request, post_id):
         return render(request, 'posts/create_post.html', {'form': form,
                                                           'post': post,
                                                           'is_edit': True})
-    post = form.save(commit=False)
-    post.author = request.user
-    form.save()
+    post = write(save_post, form, request.user)
     return redirect('posts:post_detail', post.id)
 
 
+def save_comment(form, author, post):
+    comment = form.save(commit=False)
+    comment.author = author
+    comment.post = post
+    comment.save()
+    return comment
+
+
+@query_budget(5, sharded=3)
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_post_or_404(Post.objects.all(), post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        write(save_comment, form, request.user, post)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(7, sharded=4, per_shard=2)
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = HybridFeedPaginator(request.user, settings.POSTS_PER_PAGE)
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(cursor)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(12, sharded=2)
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        write(
+            Follow.objects.on_shard_of(request.user.pk).get_or_create,
+            user=request.user, author=author
+        )
     return redirect('posts:profile', username)
 
 
+@query_budget(12)
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user == author:
         return redirect('posts:profile', username)
-    object = Follow.objects.filter(user=request.user, author=author)
+    object = Follow.objects.on_shard_of(request.user.pk).filter(
+        user=request.user, author=author
+    )
     if object.exists():
         object.delete()
     return redirect('posts:profile', username)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,20 +51,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
+    'core.routers.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'posts.uploads.ImageUploadMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.capture.ProfileCaptureMiddleware',
+    'core.write_queue.WriteTimeoutMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.templates.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,14 +94,19 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Кэш общий для всех процессов: поколения лент, фрагменты и карточки
+# должны совпадать у каждого воркера.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube-cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
     }
 }
 
@@ -141,3 +154,74 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 POSTS_PER_PAGE = 10
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+FOLLOW_FEED_BACKFILL = 1000
+FOLLOW_FEED_BATCH_SIZE = 500
+FOLLOW_FEED_CELEBRITY_THRESHOLD = 10000
+# Знаменитость снова раскладывается, когда подписчиков меньше этого.
+FOLLOW_FEED_CELEBRITY_DEMOTE_THRESHOLD = 9000
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_REPEAT_LIMIT = 2
+FEED_CACHE_TTL = 60 * 60 * 24
+POST_CARD_CACHE_TTL = 60 * 60 * 24 * 7
+BENCHMARK_BASELINE = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+BENCHMARK_TOLERANCE = {
+    'p50_ms': 1.0,
+    'p95_ms': 1.0,
+    'queries': 0,
+    'memory_kb': 0.2,
+}
+PROFILING_SAMPLE_RATE = 1.0 if DEBUG else 0.01
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'yatube-metrics')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = ('127.0.0.1',)
+# Токен сборщика Prometheus (bearer_token); пустой закрывает /metrics.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+PROFILE_CAPTURE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_CAPTURE_KEYS = ()
+PROFILE_SAMPLE_INTERVAL = 0.001
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+WRITE_QUEUE_ENABLED = False
+WRITE_QUEUE_BATCH_SIZE = 64
+WRITE_QUEUE_MAX_DELAY = 0.002
+WRITE_QUEUE_TIMEOUT = 10
+DATABASE_ROUTERS = ['posts.sharding.ShardRouter', 'core.routers.ReplicaRouter']
+# Псевдонимы баз-реплик из DATABASES; пусто — все читают из default.
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'primary'
+# Базы-шарды постов, комментариев и подписок; новые — в конец списка.
+POST_SHARDS = ['default']
+TASKS_EAGER = False
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_RETRY_MAX_DELAY = 3600
+TASK_LOCK_TIMEOUT = 600
+TASK_POLL_INTERVAL = 1
+# Размеры миниатюр картинок постов: имя -> (геометрия, опции sorl).
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'card-640': ('640x226', {'crop': 'center', 'upscale': True}),
+    'card-320': ('320x113', {'crop': 'center', 'upscale': True}),
+}
+# Варианты по ширине для srcset миниатюры.
+POST_THUMBNAIL_SRCSET = {'card': ('card-320', 'card-640', 'card')}
+# Сколько секунд помнить, что миниатюра еще не готова.
+POST_THUMBNAIL_MISSING_TTL = 5
+THUMBNAIL_REBUILD_CHECKPOINT = os.path.join(
+    tempfile.gettempdir(), 'yatube-rebuild-thumbnails.json'
+)
+# Загруженная картинка уменьшается до этой стороны и перекодируется.
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_QUALITY = 85
+# Через сколько секунд удаляется картинка, на которую не осталось ссылок.
+MEDIA_COLLECT_DELAY = 60 * 60
+# Наибольший размер загружаемого файла картинки до нормализации.
+POST_UPLOAD_MAX_SIZE = 10 * 1024 * 1024